@@ -1,7 +1,6 @@
 import random
 
 from tota.utils import distance, inside_map, circle_positions
-from tota import settings
 
 
 def check_cooldown(action):
@@ -20,9 +19,11 @@ def check_cooldown(action):
     return decorator
 
 
-def check_distance(action_distance):
+def check_distance(distance_setting):
+    """The setting is read from the world of each action, by name."""
     def decorator(f):
         def action_with_distance_check(thing, world, target_position):
+            action_distance = getattr(world.settings, distance_setting)
             if distance(thing, target_position) > action_distance:
                 event = 'too far away'
             else:
@@ -64,7 +65,7 @@ def calculate_damage(thing, base_damage, level_multiplier=None):
 
 
 @check_target_position
-@check_distance(settings.MOVE_DISTANCE)
+@check_distance('MOVE_DISTANCE')
 def move(thing, world, target_position):
     obstacle = world.things.get(target_position)
     if obstacle is not None:
@@ -72,11 +73,7 @@ def move(thing, world, target_position):
     elif not inside_map(target_position, world.size):
         event = "want's to get out of the world"
     else:
-        # we store position in the things, because they need to know it,
-        # but also in our dict, for faster access
-        world.things[target_position] = thing
-        del world.things[thing.position]
-        thing.position = target_position
+        world.move(thing, target_position)
 
         event = 'moved to {}'.format(target_position)
 
@@ -84,33 +81,33 @@ def move(thing, world, target_position):
 
 
 @check_target_position
-@check_distance(settings.HERO_ATTACK_DISTANCE)
+@check_distance('HERO_ATTACK_DISTANCE')
 def hero_attack(thing, world, target_position):
     target = world.things.get(target_position)
     if target is None:
         event = 'nothing there to attack'
     else:
         damage = calculate_damage(thing,
-                                  settings.HERO_ATTACK_BASE_DAMAGE,
-                                  settings.HERO_ATTACK_LEVEL_MULTIPLIER)
+                                  world.settings.HERO_ATTACK_BASE_DAMAGE,
+                                  world.settings.HERO_ATTACK_LEVEL_MULTIPLIER)
 
-        target.life -= damage
+        world.damage(thing, target, damage)
         event = 'damaged {} by {}'.format(target.name, damage)
 
     return event
 
 
 @check_target_position
-@check_distance(settings.TOWER_ATTACK_DISTANCE)
+@check_distance('TOWER_ATTACK_DISTANCE')
 def tower_attack(thing, world, target_position):
     target = world.things.get(target_position)
     if target is None:
         event = 'nothing there to attack'
     else:
         damage = calculate_damage(thing,
-                                  settings.TOWER_ATTACK_BASE_DAMAGE)
+                                  world.settings.TOWER_ATTACK_BASE_DAMAGE)
 
-        target.life -= damage
+        world.damage(thing, target, damage)
         event = 'damaged {} by {}'.format(target.name, damage)
 
     world.effects[target_position] = 'tower_attack'
@@ -119,39 +116,39 @@ def tower_attack(thing, world, target_position):
 
 
 @check_target_position
-@check_distance(settings.CREEP_ATTACK_DISTANCE)
+@check_distance('CREEP_ATTACK_DISTANCE')
 def creep_attack(thing, world, target_position):
     target = world.things.get(target_position)
     if target is None:
         event = 'nothing there to attack'
     else:
         damage = calculate_damage(thing,
-                                  settings.CREEP_ATTACK_BASE_DAMAGE)
+                                  world.settings.CREEP_ATTACK_BASE_DAMAGE)
 
-        target.life -= damage
+        world.damage(thing, target, damage)
         event = 'damaged {} by {}'.format(target.name, damage)
 
     return event
 
 
 @check_target_position
-@check_distance(settings.HEAL_DISTANCE)
+@check_distance('HEAL_DISTANCE')
 @check_cooldown('heal')
 def heal(thing, world, target_position):
     event_bits = []
 
     affected_positions = circle_positions(target_position,
-                                          settings.HEAL_RADIUS)
+                                          world.settings.HEAL_RADIUS)
 
     for position in affected_positions:
         target = world.things.get(position)
         if target:
             # heal avoiding health overflow
             heal = calculate_damage(thing,
-                                    settings.HEAL_BASE_HEALING,
-                                    settings.HEAL_LEVEL_MULTIPLIER)
+                                    world.settings.HEAL_BASE_HEALING,
+                                    world.settings.HEAL_LEVEL_MULTIPLIER)
 
-            target.life = min(target.max_life, target.life + heal)
+            world.heal(thing, target, heal)
 
             event_bits.append('healed {} by {}'.format(target.name, heal))
 
@@ -161,21 +158,21 @@ def heal(thing, world, target_position):
 
 
 @check_target_position
-@check_distance(settings.FIREBALL_DISTANCE)
+@check_distance('FIREBALL_DISTANCE')
 @check_cooldown('fireball')
 def fireball(thing, world, target_position):
     event_bits = []
     affected_positions = circle_positions(target_position,
-                                          settings.FIREBALL_RADIUS)
+                                          world.settings.FIREBALL_RADIUS)
 
     for position in affected_positions:
         target = world.things.get(position)
         if target:
             damage = calculate_damage(thing,
-                                      settings.FIREBALL_BASE_DAMAGE,
-                                      settings.FIREBALL_LEVEL_MULTIPLIER)
+                                      world.settings.FIREBALL_BASE_DAMAGE,
+                                      world.settings.FIREBALL_LEVEL_MULTIPLIER)
 
-            target.life -= damage
+            world.damage(thing, target, damage)
 
             event_bits.append('damaged {} with fire by {}'.format(target.name,
                                                                   damage))
@@ -186,14 +183,14 @@ def fireball(thing, world, target_position):
 
 
 @check_target_position
-@check_distance(settings.STUN_DISTANCE)
+@check_distance('STUN_DISTANCE')
 @check_cooldown('stun')
 def stun(thing, world, target_position):
     target = world.things.get(target_position)
     if target is None:
         event = 'nothing there to stun'
     else:
-        target.disabled_until = world.t + settings.STUN_DURATION
+        world.stun(thing, target, world.settings.STUN_DURATION)
         event = 'stuned {}'.format(target.name)
 
     world.effects[target_position] = 'stun'
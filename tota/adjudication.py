@@ -0,0 +1,147 @@
+from tota.things import Tower
+from tota import settings
+
+# weights of each part of the score of a team (they sum 1)
+ANCIENT_WEIGHT = 0.5
+TOWERS_WEIGHT = 0.3
+XP_WEIGHT = 0.2
+
+# score differences smaller than this are a draw when the tick cap is reached
+DRAW_MARGIN = 0.01
+
+# version of the scores, part of the key of the rules (results adjudicated
+# with other scores aren't comparable)
+SCORES_VERSION = 2
+
+TEAMS = (settings.TEAM_RADIANT, settings.TEAM_DIRE)
+
+
+class Adjudicator:
+    """Decides games that are taking too long, or that are already decided.
+
+       Each team gets a score from 0 to 1, combining the life of its ancient,
+       the life of its towers and its share of the heroes xp. A game can end:
+
+       - at max_ticks, won by the team with the higher score (a draw if the
+         scores are too close).
+       - when a team leads by resign_margin or more during resign_patience
+         ticks in a row (the other team resigns).
+    """
+    def __init__(self, max_ticks=None, resign_margin=None,
+                 resign_patience=100, check_every=10):
+        self.max_ticks = max_ticks
+        self.resign_margin = resign_margin
+        self.resign_patience = resign_patience
+        self.check_every = check_every
+
+        # total max life of the towers of each team, when the game started
+        self.towers = None
+        self.leading_since = None
+        self.last_check = None
+
+        self.decided = False
+        self.winner = None
+        self.decided_at = None
+        self.reason = None
+
+    def key(self):
+        """The rules, as text (to know if results were adjudicated the same
+           way)."""
+        return 'max_ticks={} resign_margin={} resign_patience={} scores={}'.format(
+            self.max_ticks, self.resign_margin, self.resign_patience,
+            SCORES_VERSION)
+
+    def towers_life(self, game, max_life=False):
+        """Sum of the (max) life of the towers of each team in the world."""
+        lives = {team: 0 for team in TEAMS}
+        for thing in game.world.things.values():
+            if isinstance(thing, Tower) and thing.team in lives:
+                if max_life:
+                    lives[thing.team] += thing.max_life
+                else:
+                    lives[thing.team] += max(thing.life, 0)
+        return lives
+
+    def start(self, game):
+        """Take the roster of towers of a game that is starting."""
+        self.towers = self.towers_life(game, max_life=True)
+
+    def scores(self, game):
+        """Score of each team, from 0 to 1."""
+        if self.towers is None:
+            self.start(game)
+        towers_life = self.towers_life(game)
+
+        xps = {team: sum(hero.xp for hero in game.heroes if hero.team == team)
+               for team in TEAMS}
+        total_xp = sum(xps.values())
+
+        scores = {}
+        for team in TEAMS:
+            ancient = game.ancients[team]
+            score = ANCIENT_WEIGHT * max(ancient.life, 0) / ancient.max_life
+
+            # a team without towers left gets nothing for them
+            if self.towers[team]:
+                score += TOWERS_WEIGHT * towers_life[team] / self.towers[team]
+
+            if total_xp:
+                score += XP_WEIGHT * xps[team] / total_xp
+            else:
+                score += XP_WEIGHT / 2
+
+            scores[team] = score
+
+        return scores
+
+    def decide(self, t, winner, reason):
+        self.decided = True
+        self.winner = winner
+        self.decided_at = t
+        self.reason = reason
+
+    def check(self, game):
+        """Should the game end now? (it can be called many times per tick)"""
+        if self.towers is None:
+            # adjudicators given after the game was created
+            self.start(game)
+
+        t = game.world.t
+        if self.decided or t == self.last_check:
+            return self.decided
+        self.last_check = t
+
+        cap_reached = self.max_ticks is not None and t >= self.max_ticks
+        if not cap_reached and (self.resign_margin is None or
+                                t % self.check_every != 0):
+            return False
+
+        scores = self.scores(game)
+        radiant_lead = scores[settings.TEAM_RADIANT] - scores[settings.TEAM_DIRE]
+        if radiant_lead > 0:
+            leader = settings.TEAM_RADIANT
+        else:
+            leader = settings.TEAM_DIRE
+
+        if cap_reached:
+            if abs(radiant_lead) < DRAW_MARGIN:
+                self.decide(t, None, 'tick cap reached, scores too close')
+            else:
+                self.decide(t, leader, 'tick cap reached')
+        elif abs(radiant_lead) >= self.resign_margin:
+            if self.leading_since is None or self.leading_since[0] != leader:
+                self.leading_since = (leader, t)
+            elif t - self.leading_since[1] >= self.resign_patience:
+                self.decide(t, leader, '{} resigned'.format(
+                    settings.ENEMY_TEAMS[leader]))
+        else:
+            self.leading_since = None
+
+        return self.decided
+
+    def description(self):
+        if self.winner is None:
+            return 'Draw! ({} at tick {})'.format(self.reason, self.decided_at)
+        else:
+            return 'Team {} lost! ({} at tick {})'.format(
+                settings.ENEMY_TEAMS[self.winner], self.reason, self.decided_at)
@@ -0,0 +1,165 @@
+"""Aggregates over many games saved with the columnar replay drawer.
+
+Columns are memory mapped, so only the parts needed by each query are read
+from disk, and all the work is done with numpy.
+"""
+import json
+from os import path
+
+import numpy as np
+
+
+class Replay:
+    """The memory mapped columns of a game saved by ColumnarReplayDrawer."""
+    def __init__(self, replay_dir):
+        self.replay_dir = replay_dir
+        with open(path.join(replay_dir, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+
+        self.columns = {}
+
+    def __getitem__(self, name):
+        column = self.columns.get(name)
+        if column is None:
+            if self.meta['rows'] == 0:
+                column = np.zeros(0, dtype=self.meta['columns'][name])
+            else:
+                column = np.memmap(path.join(self.replay_dir, name + '.bin'),
+                                   dtype=self.meta['columns'][name],
+                                   mode='r',
+                                   shape=(self.meta['rows'], ))
+            self.columns[name] = column
+        return column
+
+    @property
+    def ticks(self):
+        return self.meta['ticks']
+
+    def type_code(self, type_name):
+        return self.meta['types'].index(type_name)
+
+    def team_code(self, team):
+        return self.meta['teams'].index(team)
+
+    def name(self, entity):
+        return self.meta['names'][str(entity)]
+
+    def by_entity(self, rows=None):
+        """Sort rows by entity, keeping the tick order of each entity.
+
+           Returns the sorted row indexes, and a mask telling if each row is
+           followed by a row of the same entity in the very next tick.
+        """
+        if rows is None:
+            rows = np.arange(self.meta['rows'])
+        entities = np.asarray(self['entity'][rows])
+        order = rows[np.argsort(entities, kind='stable')]
+
+        entities = np.asarray(self['entity'][order])
+        ticks = np.asarray(self['tick'][order])
+        continues = np.zeros(len(order), dtype=bool)
+        continues[:-1] = ((entities[1:] == entities[:-1]) &
+                          (ticks[1:] == ticks[:-1] + 1))
+
+        return order, continues
+
+    def rows_of_type(self, type_name=None):
+        if type_name is None:
+            return np.arange(self.meta['rows'])
+        else:
+            return np.flatnonzero(self['type'] == self.type_code(type_name))
+
+    def death_rows(self, type_name=None):
+        """Rows of the last tick each thing was seen alive, before dying.
+
+           A thing died when it's missing in the next tick (heroes can
+           appear again later, when they respawn), unless the game ended.
+        """
+        order, continues = self.by_entity(self.rows_of_type(type_name))
+        died = ~continues & (np.asarray(self['tick'][order]) < self.ticks)
+        return order[died]
+
+
+def replays(replay_dirs):
+    for replay_dir in replay_dirs:
+        yield Replay(replay_dir)
+
+
+def deaths_heatmap(replay_dirs, type_name=None):
+    """Count of deaths in each position of the map, over many games."""
+    heatmap = None
+    for replay in replays(replay_dirs):
+        width, height = replay.meta['size']
+        if heatmap is None:
+            heatmap = np.zeros((height, width), dtype=np.int64)
+
+        rows = replay.death_rows(type_name)
+        np.add.at(heatmap,
+                  (np.asarray(replay['y'][rows]),
+                   np.asarray(replay['x'][rows])),
+                  1)
+
+    return heatmap
+
+
+def first_tower_deaths(replay_dirs):
+    """Tick in which each game lost its first tower (nan if it didn't)."""
+    result = []
+    for replay in replays(replay_dirs):
+        rows = replay.death_rows('Tower')
+        if len(rows):
+            result.append(replay['tick'][rows].min() + 1)
+        else:
+            result.append(np.nan)
+
+    return np.array(result, dtype=np.float64)
+
+
+def life_curves(replay_dir, type_name='Hero'):
+    """Life of each entity of a type along the game, as {name: (ticks, life)}.
+
+       Entities with the same name (like a hero that respawned) are joined
+       in the same curve.
+    """
+    replay = Replay(replay_dir)
+    mask = replay['type'] == replay.type_code(type_name)
+    entities = np.asarray(replay['entity'][mask])
+    ticks = np.asarray(replay['tick'][mask])
+    lives = np.asarray(replay['life'][mask])
+
+    curves = {}
+    for entity in np.unique(entities):
+        entity_mask = entities == entity
+        curves[replay.name(entity)] = (ticks[entity_mask], lives[entity_mask])
+
+    return curves
+
+
+def damage_taken(replay_dirs, type_name='Hero'):
+    """Total life lost by the things of a type, by name, over many games.
+
+       Healing isn't discounted, and the final blow of each death counts as
+       the life the thing had in its last tick alive.
+    """
+    totals = {}
+    for replay in replays(replay_dirs):
+        order, continues = replay.by_entity(replay.rows_of_type(type_name))
+        entities = np.asarray(replay['entity'][order])
+        lives = np.asarray(replay['life'][order], dtype=np.float64)
+        ticks = np.asarray(replay['tick'][order])
+
+        losses = np.zeros(len(order))
+        losses[1:] = np.where(continues[:-1],
+                              np.maximum(lives[:-1] - lives[1:], 0),
+                              0)
+        died = ~continues & (ticks < replay.ticks)
+        losses[died] += lives[died]
+
+        unique_entities, inverse = np.unique(entities, return_inverse=True)
+        per_entity = np.bincount(inverse, weights=losses,
+                                 minlength=len(unique_entities))
+        for entity, loss in zip(unique_entities, per_entity):
+            name = replay.name(entity)
+            totals[name] = totals.get(name, 0.0) + float(loss)
+
+    return totals
@@ -0,0 +1,97 @@
+"""Game loop for asyncio, to play many games in a single process.
+
+Heroes can be async (their act function returns an awaitable, like a
+coroutine waiting for a model server), and their acts are awaited all at the
+same time, each one with an optional timeout. Drawers can also be async
+(their draw and close methods return awaitables). Games give control to the
+others after each tick, so many games can be played concurrently.
+"""
+import asyncio
+
+from tota.batching import run_batches
+
+
+async def await_act(awaitable, timeout):
+    if timeout is None:
+        return await awaitable
+    else:
+        return await asyncio.wait_for(awaitable, timeout)
+
+
+async def await_actions(world, awaiting, actions, act_timeout=None):
+    """Await the acts of async heroes (all at once), and add their actions."""
+    results = await asyncio.gather(*[await_act(awaitable, act_timeout)
+                                     for _, awaitable in awaiting],
+                                   return_exceptions=True)
+
+    for (thing, _), act_result in zip(awaiting, results):
+        if isinstance(act_result, asyncio.TimeoutError):
+            thing.remember_action(None)
+            message = 'took more than {} seconds to act'
+            world.event(thing, message.format(act_timeout))
+        elif isinstance(act_result, BaseException):
+            world.act_error(thing, act_result)
+        else:
+            try:
+                thing.remember_action(act_result)
+                world.add_action(actions, thing, act_result)
+            except Exception as err:
+                world.act_error(thing, err)
+
+
+async def tick_async(game, act_timeout=None):
+    """Simulate one instant of a game, awaiting the async heroes."""
+    world = game.world
+    game.before_step()
+    world.start_step()
+
+    batches = {}
+    awaiting = []
+    actions = world.get_actions(batches, awaiting)
+    run_batches(batches)
+    if awaiting:
+        await await_actions(world, awaiting, actions, act_timeout)
+
+    world.finish_step(actions)
+    game.after_step()
+
+
+async def call_drawer(method, game):
+    result = method(game)
+    if hasattr(result, '__await__'):
+        await result
+
+
+async def play_async(game, frames_per_second=2.0, act_timeout=None):
+    """Game main loop, like Game.play, but for asyncio."""
+    game.start_pacing(frames_per_second)
+
+    while True:
+        await tick_async(game, act_timeout)
+
+        ended = game.game_ended()
+        for drawer in game.drawers_for_tick(ended):
+            await call_drawer(drawer.draw, game)
+        game.finish_tick()
+
+        if game.debug:
+            await asyncio.get_running_loop().run_in_executor(None, input)
+        else:
+            # even without waiting, let the other games play
+            await asyncio.sleep(game.scheduler.delay())
+
+        if ended:
+            for drawer in game.drawers:
+                await call_drawer(drawer.close, game)
+            return game.finish_game()
+
+
+async def play_games_async(games, frames_per_second=None, act_timeout=None):
+    """Play many games concurrently. Returns the description of each result.
+
+       The games share the random generator, so they aren't reproducible by
+       seed like games played one at a time.
+    """
+    return await asyncio.gather(*[play_async(game, frames_per_second,
+                                             act_timeout)
+                                  for game in games])
@@ -0,0 +1,48 @@
+"""Heroes that decide the actions of many heroes at once.
+
+A hero act function can have a ``batch`` attribute: a function receiving a
+list of (hero, things, t) requests, and returning the list of their actions
+(in the same order). The heroes with the same batch function (the same
+object, so it must be shared, like a module level function) are asked
+together, once per tick, even when they are in different worlds stepped
+together (see tota.game.step_games). That lets a hero use a model that is
+much cheaper to call once with many observations than many times.
+
+The batch_hero decorator builds a hero act function from a batch function,
+so the hero works the same in games that aren't batched.
+"""
+
+
+def batch_hero(batch_function):
+    """Make a hero act function from a batch function."""
+    def act_function(self, things, t):
+        return batch_function([(self, things, t)])[0]
+
+    act_function.batch = batch_function
+    return act_function
+
+
+def run_batches(batches):
+    """Ask the actions of the things waiting in batches, one call per batch
+       function, and add them to the actions of their worlds.
+
+       batches is a dict of {batch function: [(world, thing, actions), ...]}.
+    """
+    for batch, requests in batches.items():
+        try:
+            results = batch([(thing, world.things, world.t)
+                             for world, thing, _ in requests])
+            if len(results) != len(requests):
+                message = 'batch returned {} actions for {} things'
+                raise Exception(message.format(len(results), len(requests)))
+        except Exception as err:
+            for world, thing, _ in requests:
+                world.act_error(thing, err)
+            continue
+
+        for (world, thing, actions), act_result in zip(requests, results):
+            try:
+                thing.remember_action(act_result)
+                world.add_action(actions, thing, act_result)
+            except Exception as err:
+                world.act_error(thing, err)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""Tota engine benchmarks.
+
+Usage:
+    ./benchmark.py --help
+    ./benchmark.py scaling [-s SIZES] [-l LANES] [-d DENSITIES] [-t TOWERS] [-e HEROES] [-w WAVE_SIZES] [-n TICKS] [-k CHUNK_SIZE] [-r SEED]
+    ./benchmark.py startup [-m MAP] [-s SIZES] [-u RUNS] [-x MAX_MS]
+
+    scaling: every option accepts a comma separated list of values, and a
+    game is played for each combination of them.
+
+    startup: measure, in fresh processes, the time to import the engine and
+    set up a headless game, and fail if it's over MAX_MS milliseconds or if
+    drawers or cli dependencies were imported.
+
+Options:
+    -h --help            Show this help.
+    -s SIZES             Map sizes. Format: COLUMNSxROWS [default: 87x33].
+    -l LANES             Number of lanes (1 to 3) [default: 1].
+    -d DENSITIES         Tree density, from 0 to 1 [default: 0.9].
+    -t TOWERS            Towers per lane and team [default: 1].
+    -e HEROES            Heroes per team [default: 1].
+    -w WAVE_SIZES        Creeps per wave and team [default: 4].
+    -n TICKS             Maximum ticks of each game [default: 500].
+    -k CHUNK_SIZE        Simulate the worlds by chunks of the given size.
+    -r SEED              Seed used for the maps and the games [default: 0].
+    -m MAP               The path to the map file to use in the startup
+                         benchmark [default: ./map.txt].
+    -u RUNS              Number of processes measured in the startup
+                         benchmark [default: 10].
+    -x MAX_MS            Max milliseconds to import the engine and set up a
+                         game (median of the runs) [default: 150].
+"""
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import product
+
+from tota.game import Game
+from tota.mapgen import MapGenerator
+from tota.settings import Settings
+
+SCENARIO_HERO = 'simple'
+
+# modules that a headless game shouldn't need
+STARTUP_UNWANTED = ('docopt', 'termcolor', 'tota.drawers', 'tota.stats',
+                    'tota.memory', 'asyncio', 'tracemalloc', 'sqlite3')
+
+STARTUP_CODE = """
+import json, sys, time
+started = time.perf_counter()
+from tota.game import Game
+imported = time.perf_counter()
+Game(radiant_heroes=['{hero}'], dire_heroes=['{hero}'],
+     map_file_path=sys.argv[1], world_size=tuple(map(int, sys.argv[2:4])))
+ready = time.perf_counter()
+print(json.dumps({{'import': imported - started, 'setup': ready - imported,
+                  'modules': sorted(sys.modules)}}))
+""".format(hero=SCENARIO_HERO)
+
+
+def run_scenario(scenario):
+    """Play the headless game of a scenario, and measure it.
+
+       Runs in its own process (see scaling()), so the max resident memory
+       is the one of this game only.
+    """
+    random.seed(scenario['seed'])
+
+    generator = MapGenerator(*scenario['size'],
+                             lanes=scenario['lanes'],
+                             tree_density=scenario['density'],
+                             towers_per_lane=scenario['towers'],
+                             seed=scenario['seed'])
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False,
+                                     encoding='utf-8') as map_file:
+        map_file.write(generator.text())
+
+    try:
+        started = time.perf_counter()
+        heroes = [SCENARIO_HERO] * scenario['heroes']
+        game = Game(radiant_heroes=heroes,
+                    dire_heroes=heroes,
+                    map_file_path=map_file.name,
+                    world_size=generator.size,
+                    chunk_size=scenario['chunk_size'],
+                    settings=Settings(CREEP_WAVE_SIZE=scenario['wave_size']))
+        setup = time.perf_counter() - started
+    finally:
+        os.remove(map_file.name)
+
+    tick_times = []
+    max_things = 0
+    while game.world.t < scenario['ticks']:
+        started = time.perf_counter()
+        game.tick()
+        game.world.finish_tick()
+        tick_times.append(time.perf_counter() - started)
+        max_things = max(max_things, len(game.world.things))
+        if game.game_ended():
+            break
+
+    tick_times.sort()
+    return {
+        'setup': setup,
+        'ticks': len(tick_times),
+        'things': max_things,
+        'mean': sum(tick_times) / len(tick_times),
+        'p95': tick_times[int(len(tick_times) * 0.95)],
+        # kilobytes in linux
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def scaling(sizes, lanes, densities, towers, heroes, wave_sizes, ticks,
+            chunk_size=None, seed=0):
+    """Play a game for each combination of the parameters, measuring how the
+       tick time and memory use scale. Yields (scenario, measures)."""
+    # a fresh process per game, so one game doesn't inherit the memory of
+    # the others
+    context = multiprocessing.get_context('spawn')
+    for values in product(sizes, lanes, densities, towers, heroes, wave_sizes):
+        size, lane_count, density, tower_count, hero_count, wave_size = values
+        scenario = {
+            'size': size,
+            'lanes': lane_count,
+            'density': density,
+            'towers': tower_count,
+            'heroes': hero_count,
+            'wave_size': wave_size,
+            'ticks': ticks,
+            'chunk_size': chunk_size,
+            'seed': seed,
+        }
+        with context.Pool(1) as pool:
+            measures = pool.apply(run_scenario, (scenario, ))
+        yield scenario, measures
+
+
+def startup(map_file_path, world_size, runs):
+    """Import the engine and set up a game in fresh processes, and measure
+       it. Yields the measures of each run."""
+    # the package must be importable from the new processes, like this one
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [package_dir, environment.get('PYTHONPATH')]))
+
+    for run in range(runs):
+        started = time.perf_counter()
+        output = subprocess.check_output(
+            [sys.executable, '-c', STARTUP_CODE, map_file_path] +
+            [str(value) for value in world_size],
+            env=environment)
+        measures = json.loads(output.decode('utf-8'))
+        measures['process'] = time.perf_counter() - started
+        measures['unwanted'] = [module for module in measures.pop('modules')
+                                if module.startswith(STARTUP_UNWANTED)]
+        yield measures
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def parse_list(text, parse):
+    return [parse(value) for value in text.split(',')]
+
+
+def parse_size(text):
+    return tuple(map(int, text.split('x')))
+
+
+def benchmark():
+    """Run a benchmark, using the command line arguments."""
+    from docopt import docopt
+
+    arguments = docopt(__doc__)
+
+    if arguments['scaling']:
+        chunk_size = arguments['-k']
+        if chunk_size:
+            chunk_size = int(chunk_size)
+
+        results = scaling(sizes=parse_list(arguments['-s'], parse_size),
+                          lanes=parse_list(arguments['-l'], int),
+                          densities=parse_list(arguments['-d'], float),
+                          towers=parse_list(arguments['-t'], int),
+                          heroes=parse_list(arguments['-e'], int),
+                          wave_sizes=parse_list(arguments['-w'], int),
+                          ticks=int(arguments['-n']),
+                          chunk_size=chunk_size,
+                          seed=int(arguments['-r']))
+
+        template = ('{:>10} {:>5} {:>7} {:>6} {:>6} {:>5} {:>6} {:>7} '
+                    '{:>9} {:>9} {:>9} {:>9}')
+        print(template.format('size', 'lanes', 'density', 'towers', 'heroes',
+                              'wave', 'ticks', 'things', 'setup ms',
+                              'tick ms', 'p95 ms', 'rss KiB'))
+        for scenario, measures in results:
+            print(template.format(
+                '{}x{}'.format(*scenario['size']),
+                scenario['lanes'],
+                scenario['density'],
+                scenario['towers'],
+                scenario['heroes'],
+                scenario['wave_size'],
+                measures['ticks'],
+                measures['things'],
+                '{:.1f}'.format(measures['setup'] * 1000),
+                '{:.3f}'.format(measures['mean'] * 1000),
+                '{:.3f}'.format(measures['p95'] * 1000),
+                measures['max_rss']), flush=True)
+
+    elif arguments['startup']:
+        size = parse_size(arguments['-s'])
+        max_ms = float(arguments['-x'])
+
+        runs = list(startup(arguments['-m'], size, int(arguments['-u'])))
+        import_ms = median(run['import'] for run in runs) * 1000
+        setup_ms = median(run['setup'] for run in runs) * 1000
+        process_ms = median(run['process'] for run in runs) * 1000
+        print('import: {:.1f} ms, game setup: {:.1f} ms, whole process: '
+              '{:.1f} ms (median of {} runs)'.format(import_ms, setup_ms,
+                                                     process_ms, len(runs)))
+
+        unwanted = sorted(set(module for run in runs
+                              for module in run['unwanted']))
+        if unwanted:
+            sys.exit('Headless startup imported {}'.format(', '.join(unwanted)))
+        if import_ms + setup_ms > max_ms:
+            sys.exit('Startup took {:.1f} ms, more than the max of {:.1f} ms'.format(
+                import_ms + setup_ms, max_ms))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,63 @@
+class ChangeSet:
+    """What changed in the world during a tick.
+
+       Things are stored by id, so each one appears once per kind of change,
+       and the work needed to consume a change set depends on what happened,
+       not on the size of the world.
+    """
+    def __init__(self, t, effects, cleared_effects=()):
+        self.t = t
+        self.spawned = {}
+        # id: (thing, position before the first move, current position)
+        self.moved = {}
+        self.damaged = {}
+        self.healed = {}
+        self.stunned = {}
+        # id: (thing, position when destroyed)
+        self.destroyed = {}
+        # things that were asked for an action (they may have a new one)
+        self.acted = {}
+        # the effects dict of the world in this tick
+        self.effects = effects
+        # positions with effects in the previous tick, which are gone now
+        self.cleared_effects = list(cleared_effects)
+
+    def spawn(self, thing):
+        self.spawned[thing.id] = thing
+
+    def move(self, thing, old_position, new_position):
+        previous = self.moved.get(thing.id)
+        if previous is not None:
+            old_position = previous[1]
+        self.moved[thing.id] = (thing, old_position, new_position)
+
+    def destroy(self, thing, position):
+        self.destroyed[thing.id] = (thing, position)
+
+    def updated_things(self):
+        """Things still in the world that changed in any way."""
+        updated = {}
+        for changes in (self.spawned, self.damaged, self.healed,
+                        self.stunned, self.acted):
+            updated.update(changes)
+        for thing_id, (thing, _, _) in self.moved.items():
+            updated[thing_id] = thing
+
+        return [thing for thing_id, thing in updated.items()
+                if thing_id not in self.destroyed]
+
+    def dirty_positions(self):
+        """Positions whose contents (things or effects) may have changed."""
+        positions = set(self.effects)
+        positions.update(self.cleared_effects)
+        for changes in (self.spawned, self.damaged, self.healed,
+                        self.stunned):
+            positions.update(thing.position for thing in changes.values()
+                             if thing.position is not None)
+        for _, old_position, new_position in self.moved.values():
+            positions.add(old_position)
+            positions.add(new_position)
+        for _, position in self.destroyed.values():
+            positions.add(position)
+
+        return positions
@@ -0,0 +1,166 @@
+import marshal
+import os
+import random
+import struct
+import zlib
+from array import array
+
+from tota.things import Tree, Creep, Tower, Hero, Ancient
+
+MAGIC = b'TOTACKPT'
+VERSION = 2
+HEADER = struct.Struct('<8sHI')
+
+# things are stored as parallel arrays, with their class as a code
+KINDS = [Tree, Creep, Tower, Hero, Ancient]
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+def thing_state(thing):
+    """Mutable state of a non-tree thing, as plain data."""
+    return (thing.team,
+            thing.disabled_until,
+            dict(thing.last_uses),
+            thing.last_action,
+            thing.last_target)
+
+
+def checkpoint_data(game):
+    """Get the state of a game as plain data (no functions, no objects)."""
+    world = game.world
+    kinds = array('B')
+    xs = array('i')
+    ys = array('i')
+    lives = array('d')
+    states = []
+
+    # things are stored in the same order as in the world, so the game plays
+    # exactly the same after resuming
+    for thing in world.things.values():
+        kinds.append(KIND_CODES[type(thing)])
+        xs.append(thing.position[0])
+        ys.append(thing.position[1])
+        lives.append(thing.life)
+        if not isinstance(thing, Tree):
+            if isinstance(thing, Hero):
+                hero_index = game.heroes.index(thing)
+            else:
+                hero_index = None
+            states.append((hero_index, ) + thing_state(thing))
+
+    heroes = [(hero.name, hero.team, hero.life, hero.xp, hero.respawn_at)
+              for hero in game.heroes]
+    dead_heroes = [(index, ) + thing_state(hero)
+                   for index, hero in enumerate(game.heroes)
+                   if hero.position is None]
+
+    return {
+        't': world.t,
+        'size': tuple(world.size),
+        'random_state': random.getstate(),
+        'kinds': kinds.tobytes(),
+        'xs': xs.tobytes(),
+        'ys': ys.tobytes(),
+        'lives': lives.tobytes(),
+        'states': states,
+        'heroes': heroes,
+        'dead_heroes': dead_heroes,
+    }
+
+
+def save_checkpoint(game, path):
+    """Write a checkpoint of the game, replacing the file atomically."""
+    payload = zlib.compress(marshal.dumps(checkpoint_data(game)))
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as checkpoint_file:
+        checkpoint_file.write(HEADER.pack(MAGIC, VERSION, len(payload)))
+        checkpoint_file.write(payload)
+    os.replace(temp_path, path)
+
+
+def read_checkpoint(path):
+    """Read the plain data of a checkpoint file.
+
+       The data is stored with marshal instead of pickle, so loading a
+       checkpoint can't run code, it only builds numbers, strings, bytes and
+       containers of them.
+    """
+    with open(path, 'rb') as checkpoint_file:
+        magic, version, length = HEADER.unpack(
+            checkpoint_file.read(HEADER.size))
+        if magic != MAGIC:
+            raise Exception("{} isn't a tota checkpoint".format(path))
+        if version != VERSION:
+            message = "Unsupported checkpoint version {} in {}"
+            raise Exception(message.format(version, path))
+
+        payload = checkpoint_file.read(length)
+
+    return marshal.loads(zlib.decompress(payload))
+
+
+def restore_state(thing, state):
+    (thing.team, thing.disabled_until, thing.last_uses,
+     thing.last_action, thing.last_target) = state
+
+
+def load_checkpoint(game, path):
+    """Replace the state of a game with the one from a checkpoint.
+
+       The game must have been created with the same heroes, so their
+       functions are already bound by name. Every other thing is recreated.
+    """
+    data = read_checkpoint(path)
+
+    expected = [(name, team) for name, team, _, _, _ in data['heroes']]
+    current = [(hero.name, hero.team) for hero in game.heroes]
+    if expected != current:
+        message = "The checkpoint heroes {} don't match the game heroes {}"
+        raise Exception(message.format(expected, current))
+
+    if tuple(game.world.size) != data['size']:
+        message = "The checkpoint world size {} doesn't match the game one {}"
+        raise Exception(message.format(data['size'], game.world.size))
+
+    for hero, (_, _, life, xp, respawn_at) in zip(game.heroes, data['heroes']):
+        hero.life = life
+        hero.xp = xp
+        hero.respawn_at = respawn_at
+        hero.position = None
+
+    for hero_index, *state in data['dead_heroes']:
+        restore_state(game.heroes[hero_index], state)
+
+    world = game.world
+    world.things = {}
+    world.actors.clear()
+    world.chunks.clear()
+    world.ancients.clear()
+    world.t = data['t']
+    world.finish_tick()
+
+    kinds = array('B', data['kinds'])
+    xs = array('i', data['xs'])
+    ys = array('i', data['ys'])
+    lives = array('d', data['lives'])
+    states = iter(data['states'])
+
+    for kind_code, x, y, life in zip(kinds, xs, ys, lives):
+        kind = KINDS[kind_code]
+        if kind is Tree:
+            thing = Tree(settings=world.settings)
+        else:
+            hero_index, *state = next(states)
+            if kind is Hero:
+                thing = game.heroes[hero_index]
+            else:
+                thing = kind(state[0], settings=world.settings)
+            restore_state(thing, state)
+
+        thing.life = life
+        world.spawn(thing, (x, y))
+
+    game.ancients = {}
+    game.cache_ancients()
+
+    random.setstate(data['random_state'])
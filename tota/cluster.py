@@ -0,0 +1,528 @@
+#!/usr/bin/env python
+"""Tota distributed ladder, with a coordinator and many workers.
+
+Usage:
+    ./cluster.py --help
+    ./cluster.py coordinator HEROES [-m MAP] [-s SIZE] [-n SEEDS] [-b DATABASE] [-a] [-H HOST] [-p PORT] [-l SECONDS] [-r REPLAY_DIR] [-g KIB] [-x MAX_TICKS] [--margin=MARGIN] [-t SECONDS]
+    ./cluster.py worker [-H HOST] [-p PORT] [-r REPLAY_DIR]
+
+    HEROES must be a comma separated list
+
+Options:
+    -h --help            Show this help.
+    -m MAP               The path to the map file to use (there is a default
+                         map)
+    -s SIZE              The size of the world. Format: COLUMNSxROWS
+    -n SEEDS             Number of seeded games to play for each pairing
+                         [default: 1].
+    -b DATABASE          The path to the results database
+                         [default: ./ladder.sqlite].
+    -a                   Play all the pairings, even the ones with results
+                         already stored.
+    -H HOST              The coordinator host [default: localhost].
+    -p PORT              The coordinator port [default: 9400].
+    -l SECONDS           Seconds a worker can go without news before its
+                         job is given to another worker [default: 60].
+    -r REPLAY_DIR        Coordinator: save the replays sent by the workers
+                         in the specified dir. Worker: record replays and
+                         send them.
+    -g KIB               Memory guard: fail the matches in which memory grows
+                         more than KIB kilobytes, without more things alive
+                         to explain it.
+    -x MAX_TICKS         Adjudicate the games that reach this tick, by the
+                         life of ancients and towers, and the heroes xp.
+    --margin=MARGIN      Adjudicate the games in which a team leads the score
+                         by this margin (0 to 1) for a while.
+    -t SECONDS           Fail the matches that take more than SECONDS to
+                         play [default: 600].
+"""
+import base64
+import json
+import os
+import queue
+import random
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from os import path
+
+from tota.game import Game, Drawer
+from tota.world import EVENTS_HISTORY
+from tota.adjudication import Adjudicator
+from tota.registry import registry
+from tota.stats import StatsCollector
+from tota.settings import Settings
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 9400
+HEARTBEAT_INTERVAL = 5
+MAX_ATTEMPTS = 3
+
+
+def send_message(stream, message):
+    stream.write((json.dumps(message) + '\n').encode('utf-8'))
+    stream.flush()
+
+
+def receive_message(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('Connection closed')
+    return json.loads(line.decode('utf-8'))
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Coordinator:
+    """Serves match specs to workers, and collects their results.
+
+       Workers lease jobs, and keep their leases alive with heartbeats. When a
+       lease expires (the worker died or got disconnected), the job goes back
+       to the queue, up to a max number of attempts.
+
+       The protocol is one json message per line, over plain tcp: workers send
+       {"op": "lease"}, {"op": "heartbeat", "lease": ...} and
+       {"op": "result", "lease": ..., "result": ...}, and get a json answer
+       for each one. A job that can't be played (like one with an unknown
+       hero) is reported with an "error" instead of a "result", and fails
+       without being given to other workers.
+    """
+    def __init__(self, jobs, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 lease_timeout=60, max_attempts=MAX_ATTEMPTS):
+        self.pending = deque(jobs)
+        self.total = len(self.pending)
+        self.host = host
+        self.port = port
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+
+        self.leases = {}
+        self.attempts = {}
+        self.finished = set()
+        # (job, reason) of the jobs that couldn't be played
+        self.failed = []
+        self.completed = queue.Queue()
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def done(self):
+        return len(self.finished) + len(self.failed) >= self.total
+
+    def expire_leases(self):
+        """Put back in the queue the jobs of workers that went silent."""
+        now = time.time()
+        for lease_id, (job, worker, expires) in list(self.leases.items()):
+            if expires < now:
+                del self.leases[lease_id]
+                if self.attempts[job['id']] >= self.max_attempts:
+                    self.failed.append((job, 'no result after {} attempts'.format(
+                        self.attempts[job['id']])))
+                else:
+                    self.pending.append(job)
+
+    def handle(self, message):
+        """Answer a message from a worker."""
+        with self.lock:
+            self.expire_leases()
+            op = message.get('op')
+
+            if op == 'lease':
+                if not self.pending:
+                    return {'job': None, 'done': self.done}
+
+                job = self.pending.popleft()
+                lease_id = uuid.uuid4().hex
+                self.attempts[job['id']] = self.attempts.get(job['id'], 0) + 1
+                self.leases[lease_id] = (job, message.get('worker'),
+                                         time.time() + self.lease_timeout)
+                return {'job': job, 'lease': lease_id,
+                        'heartbeat': min(HEARTBEAT_INTERVAL,
+                                         self.lease_timeout / 3.0)}
+
+            elif op == 'heartbeat':
+                lease = self.leases.get(message.get('lease'))
+                if lease is None:
+                    return {'ok': False}
+                job, worker, _ = lease
+                self.leases[message['lease']] = (job, worker,
+                                                 time.time() + self.lease_timeout)
+                return {'ok': True}
+
+            elif op == 'result':
+                lease = self.leases.pop(message.get('lease'), None)
+                if lease is None:
+                    # expired lease, the job was already given to another
+                    # worker, or even finished
+                    return {'ok': False}
+                job, worker, _ = lease
+                if job['id'] in self.finished:
+                    pass
+                elif 'error' in message:
+                    self.failed.append((job, '{} ({})'.format(message['error'],
+                                                              worker)))
+                else:
+                    self.finished.add(job['id'])
+                    self.completed.put((job, message['result'],
+                                        message.get('replay')))
+                return {'ok': True}
+
+            else:
+                return {'error': 'unknown op {}'.format(op)}
+
+    def start(self):
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    while True:
+                        message = receive_message(self.rfile)
+                        send_message(self.wfile, coordinator.handle(message))
+                except (ConnectionError, OSError, ValueError):
+                    pass
+
+        self.server = CoordinatorServer((self.host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def run(self, on_result=None):
+        """Serve the jobs until all of them are finished (or failed), and
+           return the (job, reason) of the failed ones.
+
+           on_result(job, result, replay) is called in the calling thread for
+           each finished job.
+        """
+        if self.server is None:
+            self.start()
+
+        try:
+            while True:
+                try:
+                    job, result, replay = self.completed.get(timeout=1)
+                    if on_result is not None:
+                        on_result(job, result, replay)
+                except queue.Empty:
+                    with self.lock:
+                        self.expire_leases()
+                        if self.done and self.completed.empty():
+                            break
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+        return self.failed
+
+
+class ReplayRecorder(Drawer):
+    """Record the data of every tick (one json per line), compressing it as
+       the game is played, to send it with the results."""
+    def __init__(self):
+        self.compressor = zlib.compressobj()
+        self.chunks = []
+
+    def draw(self, game):
+        from tota.drawers.json_replay import tick_data
+        line = json.dumps(tick_data(game)) + '\n'
+        chunk = self.compressor.compress(line.encode('utf-8'))
+        if chunk:
+            self.chunks.append(chunk)
+
+    def compressed(self):
+        self.chunks.append(self.compressor.flush())
+        return base64.b64encode(b''.join(self.chunks)).decode('ascii')
+
+
+class MapFiles:
+    """Local files with the maps of the jobs (maps are sent by value), in a
+       temp dir of the worker."""
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='tota-maps-')
+        self.paths = {}
+
+    def path(self, map_text):
+        map_path = self.paths.get(map_text)
+        if map_path is None:
+            map_path = path.join(self.directory,
+                                 '{}.txt'.format(len(self.paths)))
+            with open(map_path, 'w', encoding='utf-8') as map_file:
+                map_file.write(map_text)
+            self.paths[map_text] = map_path
+        return map_path
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.paths = {}
+
+
+def check_heroes(job):
+    """Make sure the worker plays the versions of the heroes that the job was
+       scheduled for (results are stored by hero versions)."""
+    registry.refresh()
+    for team in ('radiant', 'dire'):
+        hashes = job.get(team + '_hashes')
+        if hashes is None:
+            continue
+        for name, expected_hash in zip(job[team], hashes):
+            if registry.digest(name) != expected_hash:
+                message = 'The {} hero of this worker is a different version'
+                raise Exception(message.format(name))
+
+
+class TimeLimit(Drawer):
+    """Fails a game that takes too long to play (the lease of a job is kept
+       alive by heartbeats, so the coordinator would wait forever)."""
+    def __init__(self, max_seconds):
+        self.max_seconds = max_seconds
+        self.started = time.time()
+
+    def draw(self, game):
+        if time.time() - self.started > self.max_seconds:
+            message = 'The match took more than {} seconds (tick {})'
+            raise Exception(message.format(self.max_seconds, game.world.t))
+
+
+def run_job(job, map_files, record_replay=False):
+    """Play the match of a job, and return (result, replay).
+
+       Besides the match, a job can have game settings overrides, adjudication
+       options (of Adjudicator), a max memory growth in bytes (see
+       MemoryMonitor), and a max number of seconds to play it.
+    """
+    check_heroes(job)
+
+    drawers = []
+    if job.get('max_seconds'):
+        drawers.append(TimeLimit(job['max_seconds']))
+    if record_replay:
+        recorder = ReplayRecorder()
+        drawers.append(recorder)
+
+    adjudicator = None
+    if job.get('adjudication'):
+        adjudicator = Adjudicator(**job['adjudication'])
+
+    started = time.time()
+    random.seed(job['seed'])
+    game = Game(radiant_heroes=job['radiant'],
+                dire_heroes=job['dire'],
+                map_file_path=map_files.path(job['map']),
+                world_size=tuple(job['size']),
+                drawers=drawers,
+                adjudicator=adjudicator,
+                settings=Settings(**job.get('settings', {})),
+                events_history=EVENTS_HISTORY)
+    stats = StatsCollector(game.world)
+    if job.get('max_memory_growth') is not None:
+        from tota.memory import MemoryMonitor
+        monitor = MemoryMonitor(game.world,
+                                max_growth=job['max_memory_growth'])
+        try:
+            game.play()
+        finally:
+            monitor.stop()
+    else:
+        game.play()
+
+    result = {
+        'winner': game.winner(),
+        'ticks': game.world.t,
+        'duration': time.time() - started,
+        'stats': stats.summary(),
+    }
+    if record_replay:
+        return result, recorder.compressed()
+    else:
+        return result, None
+
+
+class Heartbeat(threading.Thread):
+    """Keeps a lease alive while the worker plays the job."""
+    def __init__(self, host, port, lease_id, interval):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.lease_id = lease_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            with socket.create_connection((self.host, self.port)) as connection:
+                stream = connection.makefile('rwb')
+                while not self.stopped.wait(self.interval):
+                    send_message(stream, {'op': 'heartbeat',
+                                          'lease': self.lease_id})
+                    receive_message(stream)
+        except (ConnectionError, OSError):
+            pass
+
+    def stop(self):
+        self.stopped.set()
+
+
+def work(host=DEFAULT_HOST, port=DEFAULT_PORT, record_replays=False,
+         poll_interval=1, connect_retries=10):
+    """Lease jobs from a coordinator and play them, until there are no more.
+       Returns the number of played jobs."""
+    map_files = MapFiles()
+    try:
+        return lease_and_play(host, port, map_files, record_replays,
+                              poll_interval, connect_retries)
+    finally:
+        map_files.remove()
+
+
+def lease_and_play(host, port, map_files, record_replays, poll_interval,
+                   connect_retries):
+    worker_name = '{}:{}'.format(socket.gethostname(), os.getpid())
+    played = 0
+    retries = 0
+
+    while True:
+        try:
+            with socket.create_connection((host, port)) as connection:
+                retries = 0
+                stream = connection.makefile('rwb')
+                while True:
+                    send_message(stream, {'op': 'lease',
+                                          'worker': worker_name})
+                    answer = receive_message(stream)
+                    job = answer.get('job')
+                    if job is None:
+                        if answer.get('done'):
+                            return played
+                        time.sleep(poll_interval)
+                        continue
+
+                    heartbeat = Heartbeat(host, port, answer['lease'],
+                                          answer['heartbeat'])
+                    heartbeat.start()
+                    try:
+                        result, replay = run_job(job, map_files,
+                                                 record_replays)
+                        message = {'op': 'result', 'lease': answer['lease'],
+                                   'result': result, 'replay': replay}
+                        played += 1
+                    except Exception as err:
+                        # a bad job shouldn't kill the worker, nor be given
+                        # to other workers to kill them too
+                        message = {'op': 'result', 'lease': answer['lease'],
+                                   'error': '{}: {}'.format(
+                                       type(err).__name__, err)}
+                    finally:
+                        heartbeat.stop()
+
+                    send_message(stream, message)
+                    receive_message(stream)
+        except (ConnectionError, OSError):
+            retries += 1
+            if retries > connect_retries:
+                return played
+            time.sleep(poll_interval)
+
+
+def ladder_jobs(matches, map_file_path, world_size, adjudication=None,
+                max_memory_growth=None, max_seconds=None):
+    """Jobs to play the pending matches of a ladder."""
+    with open(map_file_path, encoding='utf-8') as map_file:
+        map_text = map_file.read()
+
+    return [{
+        'id': index,
+        'radiant': [match.radiant],
+        'radiant_hashes': [match.radiant_hash],
+        'dire': [match.dire],
+        'dire_hashes': [match.dire_hash],
+        'map': map_text,
+        'size': list(world_size),
+        'seed': match.seed,
+        'settings': {},
+        'adjudication': adjudication or {},
+        'max_memory_growth': max_memory_growth,
+        'max_seconds': max_seconds,
+    } for index, match in enumerate(matches)]
+
+
+def cluster():
+    """Run a coordinator or a worker, using the command line arguments."""
+    from docopt import docopt
+    from tota import ladder
+
+    arguments = docopt(__doc__)
+    host = arguments['-H']
+    port = int(arguments['-p'])
+    replay_dir = arguments['-r']
+
+    if arguments['worker']:
+        played = work(host, port, record_replays=bool(replay_dir))
+        print('{} matches played'.format(played))
+        return
+
+    heroes = arguments['HEROES'].split(',')
+    size = arguments['-s']
+    if size:
+        size = tuple(map(int, size.split('x')))
+    else:
+        size = ladder.DEFAULT_MAP_SIZE
+    map_path = arguments['-m'] or ladder.DEFAULT_MAP_PATH
+
+    max_memory_growth = arguments['-g']
+    if max_memory_growth:
+        max_memory_growth = int(max_memory_growth) * 1024
+
+    adjudication = {}
+    if arguments['-x']:
+        adjudication['max_ticks'] = int(arguments['-x'])
+    if arguments['--margin']:
+        adjudication['resign_margin'] = float(arguments['--margin'])
+
+    store = ladder.ResultsStore(arguments['-b'])
+    matches = ladder.schedule(store, heroes, map_path, size,
+                              int(arguments['-n']), play_all=arguments['-a'],
+                              adjudication=adjudication)
+    jobs = ladder_jobs(matches, map_path, size, adjudication,
+                       max_memory_growth, float(arguments['-t']))
+    print('{} matches to play'.format(len(jobs)))
+
+    def on_result(job, result, replay):
+        store.save(matches[job['id']], result['winner'], result['ticks'],
+                   result['duration'])
+        if replay_dir and replay:
+            replay_path = path.join(replay_dir, '{:06d}.jsonl.z'.format(job['id']))
+            with open(replay_path, 'wb') as replay_file:
+                replay_file.write(base64.b64decode(replay))
+
+    if replay_dir:
+        os.makedirs(replay_dir, exist_ok=True)
+
+    coordinator = Coordinator(jobs, host, port,
+                              lease_timeout=float(arguments['-l']))
+    failed = coordinator.run(on_result)
+    if failed:
+        print('{} matches failed'.format(len(failed)))
+        for job, reason in failed:
+            print('  {} vs {} (seed {}): {}'.format(
+                ', '.join(job['radiant']), ', '.join(job['dire']),
+                job['seed'], reason))
+
+    for position, (name, row) in enumerate(ladder.standings(store, heroes,
+                                                            map_path, size,
+                                                            adjudication), 1):
+        print('{}. {} {:.0f} ({} wins, {} losses, {} draws)'.format(
+            position, name, row['rating'],
+            row['wins'], row['losses'], row['draws']))
+
+    store.close()
+
+
+if __name__ == '__main__':
+    cluster()
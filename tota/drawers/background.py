@@ -0,0 +1,97 @@
+import threading
+from collections import deque
+
+from tota.game import Drawer
+
+BLOCK = 'block'
+DROP = 'drop'
+COALESCE = 'coalesce'
+
+
+class BackgroundDrawer(Drawer):
+    """Run another drawer in a background thread.
+
+       In each tick only a snapshot of the game is taken in the game thread
+       (see Drawer.snapshot), and handed to the background thread through a
+       bounded queue, where the snapshots are drawn in batches. When the
+       queue is full, the policy decides what to do: 'block' waits for the
+       drawer, 'drop' forgets the new snapshot, and 'coalesce' replaces all
+       the pending snapshots with the new one (useful for live views).
+    """
+    def __init__(self, drawer, queue_size=100, policy=BLOCK, batch_size=50):
+        if policy not in (BLOCK, DROP, COALESCE):
+            raise Exception('Invalid backpressure policy: {}'.format(policy))
+
+        self.drawer = drawer
+        self.interactive = drawer.interactive
+        self.queue_size = queue_size
+        self.policy = policy
+        self.batch_size = batch_size
+
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.finished = False
+        self.dropped = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def draw(self, game):
+        """Take a snapshot of the game, and queue it."""
+        with self.condition:
+            if self.error is not None:
+                raise self.error
+
+            if len(self.pending) >= self.queue_size:
+                if self.policy == DROP:
+                    self.dropped += 1
+                    return
+                elif self.policy == COALESCE:
+                    self.dropped += len(self.pending)
+                    self.pending.clear()
+                else:
+                    while len(self.pending) >= self.queue_size:
+                        self.condition.wait()
+
+        snapshot = self.drawer.snapshot(game)
+
+        with self.condition:
+            self.pending.append(snapshot)
+            self.condition.notify_all()
+
+    def work(self):
+        """Draw the queued snapshots, in batches (background thread)."""
+        while True:
+            with self.condition:
+                while not self.pending and not self.finished:
+                    self.condition.wait()
+                if not self.pending and self.finished:
+                    return
+
+                batch = []
+                while self.pending and len(batch) < self.batch_size:
+                    batch.append(self.pending.popleft())
+                self.condition.notify_all()
+
+            try:
+                self.drawer.draw_snapshots(batch)
+            except Exception as err:
+                with self.condition:
+                    self.error = err
+                    self.pending.clear()
+                    self.finished = True
+                    self.condition.notify_all()
+                return
+
+    def close(self, game):
+        """Wait until all the queued snapshots are drawn, and close."""
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+        self.drawer.close(game)
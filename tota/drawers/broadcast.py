@@ -0,0 +1,287 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+
+from tota.game import Drawer
+from tota.drawers.json_replay import tick_data, thing_data, effects_data
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC11B65'
+
+
+def websocket_frame(payload):
+    """Wrap bytes in a (server to client, unmasked) websocket text frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x81, length)
+    elif length < 2 ** 16:
+        header = struct.pack('!BBH', 0x81, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, length)
+
+    return header + payload
+
+
+class Frame:
+    """A tick, serialized once and shared by all the clients.
+
+       Encodings are built lazily, and only once: the json line for tcp
+       clients, and its websocket frame for websocket clients.
+    """
+    def __init__(self, data):
+        self.data = data
+        self._line = None
+        self._websocket = None
+
+    def line(self):
+        if self._line is None:
+            self._line = (json.dumps(self.data) + '\n').encode('utf-8')
+        return self._line
+
+    def websocket(self):
+        if self._websocket is None:
+            self._websocket = websocket_frame(self.line())
+        return self._websocket
+
+    def encoded(self, use_websocket):
+        if use_websocket:
+            return self.websocket()
+        else:
+            return self.line()
+
+
+class Viewer:
+    """A connected client, with its own bounded queue of frames."""
+    def __init__(self, writer, use_websocket, queue_size):
+        self.writer = writer
+        self.use_websocket = use_websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.needs_keyframe = True
+        self.task = asyncio.current_task()
+
+
+class BroadcastDrawer(Drawer):
+    """Broadcast the game to any number of spectators, over tcp/websockets.
+
+       Each tick is serialized only once, as a delta with the things that
+       changed in the tick (see World.changes), and shared by all the
+       viewers. Ticks skipped by the game loop (when it falls behind) are
+       merged into the delta of the next drawn tick, so catching up doesn't
+       need keyframes. Frames are sent from an asyncio loop in a background
+       thread, using a bounded queue per viewer: when a viewer falls behind,
+       its queued deltas are dropped and it gets a full keyframe instead, so
+       slow viewers never stall the game.
+
+       Tcp clients receive one json document per line. Websocket clients
+       receive the same documents as text messages.
+    """
+    interactive = True
+
+    def __init__(self, host='localhost', port=9000, websocket_port=None,
+                 queue_size=50):
+        self.host = host
+        self.port = port
+        self.websocket_port = websocket_port
+        self.queue_size = queue_size
+
+        self.viewers = set()
+        self.keyframe_requested = False
+        self.last_t = None
+        # the world the drawer listens to, the changes of the last drawn tick,
+        # and the changes of the ticks skipped since then
+        self.world = None
+        self.drawn_changes = None
+        self.skipped_changes = []
+        self.servers = []
+        # error starting the servers (like a port in use), if any
+        self.error = None
+
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.start_servers())
+        except Exception as err:
+            self.error = err
+            for server in self.servers:
+                server.close()
+            self.loop.close()
+            return
+        finally:
+            self.started.set()
+
+        self.loop.run_forever()
+
+    async def start_servers(self):
+        server = await asyncio.start_server(self.serve_tcp,
+                                            self.host, self.port)
+        self.servers.append(server)
+
+        if self.websocket_port is not None:
+            server = await asyncio.start_server(self.serve_websocket,
+                                                self.host, self.websocket_port)
+            self.servers.append(server)
+
+    async def serve_tcp(self, reader, writer):
+        await self.serve(writer, use_websocket=False)
+
+    async def serve_websocket(self, reader, writer):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if not line or line in (b'\r\n', b'\n'):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        key = headers.get('sec-websocket-key')
+        if key is None:
+            writer.close()
+            return
+
+        accept = base64.b64encode(
+            hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()
+        ).decode('ascii')
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\n'
+                      'Upgrade: websocket\r\n'
+                      'Connection: Upgrade\r\n'
+                      'Sec-WebSocket-Accept: {}\r\n\r\n').format(accept)
+                     .encode('ascii'))
+
+        await self.serve(writer, use_websocket=True)
+
+    async def serve(self, writer, use_websocket):
+        """Send the frames queued for a viewer, until it disconnects."""
+        viewer = Viewer(writer, use_websocket, self.queue_size)
+        self.viewers.add(viewer)
+        try:
+            while True:
+                frame = await viewer.queue.get()
+                if frame is None:
+                    break
+                writer.write(frame.encoded(use_websocket))
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            writer.close()
+
+    def publish(self, delta, keyframe):
+        """Queue a new frame for each viewer (runs in the loop thread).
+
+           Keyframes are expensive, so they are only built when some viewer
+           asked for one in the previous tick.
+        """
+        for viewer in self.viewers:
+            if viewer.queue.full():
+                # slow viewer: forget the deltas, and catch up with a keyframe
+                while not viewer.queue.empty():
+                    viewer.queue.get_nowait()
+                viewer.needs_keyframe = True
+
+            if viewer.needs_keyframe:
+                if keyframe is None:
+                    self.keyframe_requested = True
+                    continue
+                frame = keyframe
+            else:
+                frame = delta
+
+            viewer.queue.put_nowait(frame)
+            viewer.needs_keyframe = False
+
+    def tick_changes(self, changes):
+        """Keep the changes of the ticks that weren't drawn (listener)."""
+        if changes is not self.drawn_changes:
+            self.skipped_changes.append(changes)
+
+    def listen(self, world):
+        if self.world is not None:
+            self.world.unsubscribe(self)
+        self.world = world
+        self.skipped_changes = []
+        world.subscribe(self)
+
+    def delta_data(self, game, changes_list):
+        """The changes of one or more ticks, merged in a single delta."""
+        updated = {}
+        destroyed = {}
+        for changes in changes_list:
+            for thing in changes.updated_things():
+                updated[thing.id] = thing
+            destroyed.update(changes.destroyed)
+
+        return {
+            'type': 'delta',
+            't': game.world.t,
+            # things can die and respawn (heroes) between drawn ticks
+            'things': [thing_data(thing) for thing in updated.values()
+                       if thing.position is not None],
+            'removed': [thing_id for thing_id, (thing, _) in destroyed.items()
+                        if thing.position is None],
+            'effects': effects_data(game.world),
+        }
+
+    def draw(self, game):
+        """Serialize the tick as a delta, and hand it to the viewers."""
+        changes = getattr(game.world, 'changes', None)
+        if changes is not None and self.world is not game.world:
+            self.listen(game.world)
+
+        skipped = self.skipped_changes
+        self.skipped_changes = []
+        self.drawn_changes = changes
+        # the skipped ticks must have been seen, to be merged in the delta
+        missed_ticks = (self.last_t is not None and
+                        game.world.t != self.last_t + 1 + len(skipped))
+        self.last_t = game.world.t
+
+        if changes is None or missed_ticks:
+            # deltas can't be built, everyone needs a keyframe
+            keyframe = Frame(dict(tick_data(game), type='keyframe'))
+            delta = keyframe
+        else:
+            delta = Frame(self.delta_data(game, skipped + [changes]))
+
+            if self.keyframe_requested:
+                self.keyframe_requested = False
+                keyframe = Frame(dict(tick_data(game), type='keyframe'))
+            else:
+                keyframe = None
+
+        self.loop.call_soon_threadsafe(self.publish, delta, keyframe)
+
+    def close(self, game):
+        """Send the pending frames, disconnect the viewers and stop."""
+        if self.world is not None:
+            self.world.unsubscribe(self)
+            self.world = None
+        async def shutdown():
+            for server in self.servers:
+                server.close()
+
+            viewers = list(self.viewers)
+            for viewer in viewers:
+                if viewer.queue.full():
+                    viewer.queue.get_nowait()
+                viewer.queue.put_nowait(None)
+
+            if viewers:
+                await asyncio.wait([viewer.task for viewer in viewers],
+                                   timeout=5)
+            self.loop.stop()
+
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(
+                lambda: self.loop.create_task(shutdown()))
+            self.thread.join()
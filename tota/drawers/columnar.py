@@ -0,0 +1,118 @@
+import json
+import sys
+from array import array
+from os import path, makedirs
+
+from tota.game import Drawer
+from tota import settings
+
+# column name, and array type code (all stored little endian, fixed width)
+COLUMNS = (
+    ('tick', 'i'),
+    ('entity', 'q'),
+    ('type', 'B'),
+    ('team', 'B'),
+    ('x', 'i'),
+    ('y', 'i'),
+    ('life', 'f'),
+    ('action', 'B'),
+    ('target_x', 'i'),
+    ('target_y', 'i'),
+)
+NUMPY_TYPES = {'i': '<i4', 'q': '<i8', 'B': 'u1', 'f': '<f4'}
+
+TYPES = ['Tree', 'Creep', 'Tower', 'Hero', 'Ancient']
+TEAMS = [settings.TEAM_NEUTRAL, settings.TEAM_RADIANT, settings.TEAM_DIRE]
+ACTIONS = [None, 'move', 'attack', 'heal', 'fireball', 'stun']
+UNKNOWN_ACTION = 255
+NO_TARGET = -1
+
+
+class ColumnarReplayDrawer(Drawer):
+    """Save the history of a game as fixed width columns, one file each.
+
+       Each row is a thing in a tick. Columns are raw arrays that can be
+       memory mapped (see ``tota.analytics``), and their types and codes are
+       described in a ``meta.json`` file written when the game ends. Trees
+       are skipped unless asked for, they are most of the map and never move.
+    """
+    def __init__(self, replay_dir, include_trees=False, flush_every=100):
+        self.replay_dir = replay_dir
+        self.include_trees = include_trees
+        self.flush_every = flush_every
+
+        makedirs(replay_dir, exist_ok=True)
+        for name, _ in COLUMNS:
+            open(self.column_path(name), 'wb').close()
+
+        self.buffers = {name: array(type_code) for name, type_code in COLUMNS}
+        self.rows = 0
+        self.names = {}
+
+    def column_path(self, name):
+        return path.join(self.replay_dir, name + '.bin')
+
+    def draw(self, game):
+        """Add a row for each thing in the world."""
+        columns = self.buffers
+        t = game.world.t
+        for thing in game.world.things.values():
+            type_name = thing.__class__.__name__
+            if type_name == 'Tree' and not self.include_trees:
+                continue
+
+            columns['tick'].append(t)
+            columns['entity'].append(thing.id)
+            if thing.id not in self.names:
+                self.names[thing.id] = thing.name
+            columns['type'].append(TYPES.index(type_name))
+            columns['team'].append(TEAMS.index(thing.team))
+            columns['x'].append(thing.position[0])
+            columns['y'].append(thing.position[1])
+            columns['life'].append(thing.life)
+
+            if thing.last_action in ACTIONS:
+                columns['action'].append(ACTIONS.index(thing.last_action))
+            else:
+                columns['action'].append(UNKNOWN_ACTION)
+
+            target = thing.last_target
+            if isinstance(target, tuple) and len(target) == 2:
+                columns['target_x'].append(target[0])
+                columns['target_y'].append(target[1])
+            else:
+                columns['target_x'].append(NO_TARGET)
+                columns['target_y'].append(NO_TARGET)
+
+        if t % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the column files."""
+        for name, buffer in self.buffers.items():
+            if sys.byteorder == 'big':
+                buffer.byteswap()
+            with open(self.column_path(name), 'ab') as column_file:
+                buffer.tofile(column_file)
+
+        self.rows += len(self.buffers['tick'])
+        self.buffers = {name: array(type_code) for name, type_code in COLUMNS}
+
+    def close(self, game):
+        """Flush the pending rows, and describe the columns."""
+        self.flush()
+
+        meta = {
+            'rows': self.rows,
+            'ticks': game.world.t,
+            'size': list(game.world.size),
+            'columns': {name: NUMPY_TYPES[type_code]
+                        for name, type_code in COLUMNS},
+            'types': TYPES,
+            'teams': TEAMS,
+            'actions': ACTIONS,
+            'names': self.names,
+            'result': game.game_result(),
+        }
+        with open(path.join(self.replay_dir, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file)
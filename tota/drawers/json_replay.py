@@ -4,44 +4,59 @@ from os import path
 from tota.game import Drawer
 
 
+def thing_data(thing):
+    """Get the data of a thing, as json serializable structures."""
+    data = {
+        'id': thing.id,
+        'type': thing.__class__.__name__,
+        'position': thing.position,
+    }
+    if data['type'] != 'Tree':
+        data.update({
+            'life': thing.life,
+            'name': thing.name,
+            'team': thing.team,
+            'level': getattr(thing, 'level', None),
+            'xp': getattr(thing, 'xp', None),
+            'action': thing.last_action,
+            'target': thing.last_target,
+        })
+
+    return data
+
+
+def effects_data(world):
+    return [{
+                'position': position,
+                'effect': effect,
+            }
+            for position, effect in world.effects.items()]
+
+
+def tick_data(game):
+    """Get the data of the current tick, as json serializable structures."""
+    return {
+        't': game.world.t,
+        'things': [thing_data(thing) for thing in game.world.things.values()],
+        'effects': effects_data(game.world),
+    }
+
+
 class JsonReplayDrawer(Drawer):
     def __init__(self, replay_dir):
         self.replay_dir = replay_dir
 
     def draw(self, game):
         """Draw the world with 'ascii'-art ."""
-        things_data = []
-        tick_data = {
-            't': game.world.t,
-            'things': things_data,
-            'effects': [{
-                            'position': position,
-                            'effect': effect,
-                        }
-                        for position, effect in game.world.effects.items()]
-        }
-
-        for thing in game.world.things.values():
-            thing_data = {
-                'id': id(thing),
-                'type': thing.__class__.__name__,
-                'position': thing.position,
-            }
-            if thing_data['type'] != 'Tree':
-                thing_data.update({
-                    'life': thing.life,
-                    'name': thing.name,
-                    'team': thing.team,
-                    'level': getattr(thing, 'level', None),
-                    'xp': getattr(thing, 'xp', None),
-                    'action': thing.last_action,
-                    'target': thing.last_target,
-                })
-
-            things_data.append(thing_data)
-
-        tick_path = path.join(self.replay_dir, '%08d.json' % game.world.t)
-        with open(tick_path, 'w') as tick_file:
-            json.dump(tick_data,
-                      tick_file,
-                      indent=2 if game.debug else None)
+        self.draw_snapshots([self.snapshot(game)])
+
+    def snapshot(self, game):
+        return game.world.t, tick_data(game), game.debug
+
+    def draw_snapshots(self, snapshots):
+        """Write a file for each tick."""
+        for t, data, debug in snapshots:
+            tick_path = path.join(self.replay_dir, '%08d.json' % t)
+            with open(tick_path, 'w') as tick_file:
+                # a lot faster than json.dump, which writes in small chunks
+                tick_file.write(json.dumps(data, indent=2 if debug else None))
@@ -5,9 +5,48 @@ from termcolor import colored
 
 
 class TerminalDrawer(Drawer):
-    def __init__(self, use_basic_icons=False, use_compressed_view=False):
+    interactive = True
+
+    def __init__(self, use_basic_icons=False, use_compressed_view=False,
+                 viewport=None, follow=None):
         self.use_basic_icons = use_basic_icons
         self.use_compressed_view = use_compressed_view
+        # size of the window of the world to draw (None draws all of it),
+        # its top left corner, and the name of a hero to keep centered
+        self.viewport = viewport
+        self.origin = (0, 0)
+        self.follow = follow
+
+        # what was drawn last time, to be able to draw only the changes
+        self.last_window = None
+        self.last_t = None
+
+    def scroll(self, delta_x, delta_y):
+        """Move the viewport (stops following a hero)."""
+        self.follow = None
+        self.origin = (self.origin[0] + delta_x, self.origin[1] + delta_y)
+
+    def window(self, game):
+        """Get the top left corner and size of the part of the world to draw."""
+        world_width, world_height = game.world.size
+        if self.viewport is None:
+            return (0, 0), (world_width, world_height)
+
+        width = min(self.viewport[0], world_width)
+        height = min(self.viewport[1], world_height)
+
+        if self.follow is not None:
+            for hero in game.heroes:
+                if hero.name == self.follow and hero.position is not None:
+                    self.origin = (hero.position[0] - width // 2,
+                                   hero.position[1] - height // 2)
+
+        # keep the window inside the world
+        x = max(0, min(self.origin[0], world_width - width))
+        y = max(0, min(self.origin[1], world_height - height))
+        self.origin = (x, y)
+
+        return self.origin, (width, height)
 
     def position_draw(self, game, position):
         """Get the string to draw for a given position of the world."""
@@ -41,15 +80,43 @@ class TerminalDrawer(Drawer):
 
     def draw(self, game):
         """Draw the world with 'ascii'-art ."""
-        screen = ''
-
-        # print the world
-        screen += '\n'.join(u''.join(self.position_draw(game, (x, y))
-                                     for x in range(game.world.size[0]))
-                            for y in range(game.world.size[1]))
+        window = self.window(game)
+        (min_x, min_y), (width, height) = window
+
+        # if the previous tick is on screen, only the positions that changed
+        # need to be drawn again
+        changes = getattr(game.world, 'changes', None)
+        incremental = (changes is not None and
+                       window == self.last_window and
+                       self.last_t is not None and
+                       game.world.t == self.last_t + 1)
+        self.last_window = window
+        self.last_t = game.world.t
+
+        if incremental:
+            if self.use_compressed_view:
+                cell_width = 1
+            else:
+                cell_width = 2
+
+            screen = ''
+            for x, y in sorted(changes.dirty_positions()):
+                if min_x <= x < min_x + width and min_y <= y < min_y + height:
+                    screen += '\033[{};{}H'.format(y - min_y + 1,
+                                                   (x - min_x) * cell_width + 1)
+                    screen += self.position_draw(game, (x, y))
+            screen += '\033[{};1H'.format(height + 1)
+        else:
+            # print the world (or the visible part of it)
+            GO_TO_TOP = '\033[0;0H'
+            screen = GO_TO_TOP
+            screen += '\n'.join(u''.join(self.position_draw(game, (x, y))
+                                         for x in range(min_x, min_x + width))
+                                for y in range(min_y, min_y + height))
+            screen += '\n'
 
         # game stats
-        screen += '\nticks:{}'.format(game.world.t)
+        screen += 'ticks:{}'.format(game.world.t)
 
         # print hero stats
         for hero in sorted(game.heroes, key=lambda x: x.name):
@@ -86,6 +153,5 @@ class TerminalDrawer(Drawer):
                                           settings.TEAM_COLORS[thing.team])
                                   for t, thing, event in game.world.events
                                   if t == game.world.t])
-        GO_TO_TOP = '\033[0;0H'
-        print(GO_TO_TOP + screen)
+        print(screen)
 
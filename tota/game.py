@@ -1,46 +1,120 @@
-import time
-
 from tota.world import World
+from tota.resolution import SEQUENTIAL
 from tota.things import Ancient, Hero, Creep, Tower
-from tota.utils import closes_empty_position, distance
+from tota.utils import distance
+from tota.batching import run_batches
+from tota.spawning import SpawnAllocator
+from tota.registry import registry as default_registry
+from tota.pacing import FrameScheduler
+from tota.settings import Settings
 from tota import settings
 
 
-def get_hero_function(name):
-    module = __import__('tota.heroes.' + name, fromlist=['create', ])
-    create_function = getattr(module, 'create')
+def get_hero_function(name, registry=None):
+    create_function = (registry or default_registry).get(name)
 
     return create_function()
 
 
+def step_games(games):
+    """Simulate one instant of many games, asking the heroes with the same
+       batch function all at once (see tota.batching)."""
+    for game in games:
+        game.before_step()
+
+    batches = {}
+    actions = []
+    for game in games:
+        game.world.start_step()
+        actions.append(game.world.get_actions(batches))
+    run_batches(batches)
+
+    for game, game_actions in zip(games, actions):
+        game.world.finish_step(game_actions)
+        game.after_step()
+
+
+def play_games(games):
+    """Play many games at the same time, without pacing them, until all of
+       them end. Returns the description of each result."""
+    playing = list(games)
+    while playing:
+        step_games(playing)
+        for game in list(playing):
+            game.draw()
+            game.world.finish_tick()
+            if game.game_ended():
+                game.close_drawers()
+                playing.remove(game)
+
+    return [game.game_result() for game in games]
+
+
 class Drawer:
+    # interactive drawers are watched live, so the game is paced for them
+    interactive = False
+
     def draw(self, game):
         pass
 
+    def snapshot(self, game):
+        """Immutable copy of what the drawer needs to draw the current tick."""
+        from tota.snapshot import GameSnapshot
+        return GameSnapshot(game)
+
+    def draw_snapshots(self, snapshots):
+        """Draw many ticks at once, from their snapshots."""
+        for snapshot in snapshots:
+            self.draw(snapshot)
+
+    def close(self, game):
+        pass
+
 
 class Game:
     """An instance of game controls the flow of the game.
 
        This includes player and creeps spawning, game main loop, deciding when
        to stop, importing map data, drawing each update, etc.
+
+       The rules of the game are its settings (a tota.settings.Settings, by
+       default the values of the settings module), so games with different
+       rules can be played in the same process.
     """
     def __init__(self, radiant_heroes, dire_heroes, map_file_path, world_size,
-                 debug=False, drawers=None):
+                 debug=False, drawers=None, hero_registry=None,
+                 chunk_size=None, checkpoint_path=None,
+                 checkpoint_every=None, resolution=SEQUENTIAL,
+                 adjudicator=None, settings=None, events_history=None):
         self.radiant_heroes = radiant_heroes
         self.dire_heroes = dire_heroes
         self.map_file_path = map_file_path
         self.debug = debug
         self.drawers = drawers or []
+        self.hero_registry = hero_registry
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        if checkpoint_every and not checkpoint_path:
+            raise Exception("checkpoint_every needs a checkpoint_path")
 
         self.heroes = []
         self.ancients = {}
+        self.spawners = {}
+        self.scheduler = None
+        self.adjudicator = adjudicator
+        self.settings = settings or Settings()
 
-        self.world = World(world_size, debug=debug)
+        self.world = World(world_size, debug=debug, chunk_size=chunk_size,
+                           resolution=resolution, settings=self.settings,
+                           events_history=events_history)
 
         self.initialize_world_map()
         self.cache_ancients()
         self.initialize_heroes()
 
+        if self.adjudicator is not None:
+            self.adjudicator.start(self)
+
     def initialize_world_map(self):
         with open(self.map_file_path, encoding='utf-8') as map_file:
             map_text = map_file.read()
@@ -59,8 +133,14 @@ class Game:
             else:
                 return ancients[0]
 
+        for spawner in self.spawners.values():
+            self.world.unsubscribe(spawner)
+        self.spawners = {}
+
         for team in (settings.TEAM_DIRE, settings.TEAM_RADIANT):
             self.ancients[team] = get_ancient(team)
+            self.spawners[team] = SpawnAllocator(self.world,
+                                                 self.ancients[team].position)
 
     def initialize_heroes(self):
         teams = {
@@ -71,93 +151,209 @@ class Game:
             for hero_name in heroes:
                 hero = Hero(name=hero_name,
                             team=team,
-                            act_function=get_hero_function(hero_name))
+                            act_function=get_hero_function(hero_name,
+                                                           self.hero_registry),
+                            settings=self.settings)
                 self.heroes.append(hero)
 
     def spawn_near_ancient(self, thing):
         """Spawn players or creeps near their ancient."""
-        # start searching from the ancient position, outwards, until an empty
-        # space is found, using breadth first graph search
-        ancient = self.ancients[thing.team]
-        spawn_at = closes_empty_position(ancient, self.world)
-        if spawn_at:
-            self.world.spawn(thing, spawn_at)
-        else:
-            message = "Can't spawn {} near its ancient".format(thing.name)
-            raise Exception(message)
+        self.spawn_group_near_ancient(thing.team, [thing])
+
+    def spawn_group_near_ancient(self, team, things):
+        """Spawn many things of a team near their ancient, at once."""
+        # the closest empty positions to the ancient, searching outwards in
+        # rings
+        positions = self.spawners[team].allocate(len(things))
+        if len(positions) < len(things):
+            message = "Can't spawn {} near its ancient"
+            raise Exception(message.format(things[len(positions)].name))
+
+        for thing, position in zip(things, positions):
+            self.world.spawn(thing, position)
 
     def play(self, frames_per_second=2.0):
-        """Game main loop, ending in a game result with description."""
-        while True:
-            # spawn creep wave
-            if self.world.t % settings.CREEP_WAVE_COOLDOWN == 0:
-                for team in (settings.TEAM_RADIANT, settings.TEAM_DIRE):
-                    for i in range(settings.CREEP_WAVE_SIZE):
-                        creep = Creep(team)
-                        self.spawn_near_ancient(creep)
+        """Game main loop, ending in a game result with description.
 
-            self.spawn_heroes()
-            self.world.step()
-            self.update_experience()
-            self.clean_deads()
+           The game runs unthrottled if there are no interactive drawers.
+        """
+        self.start_pacing(frames_per_second)
 
-            self.draw()
+        while True:
+            self.tick()
 
-            self.world.effects = {}
+            ended = self.game_ended()
+            self.draw(self.drawers_for_tick(ended))
+            self.finish_tick()
 
             if self.debug:
                 input()
             else:
-                time.sleep(1.0 / frames_per_second)
+                self.scheduler.wait()
+
+            if ended:
+                self.close_drawers()
+                return self.finish_game()
+
+    def start_pacing(self, frames_per_second):
+        """Create the frame scheduler of a game loop (Game.play, or the
+           async one)."""
+        if not any(drawer.interactive for drawer in self.drawers):
+            frames_per_second = None
 
-            if self.game_ended():
-                description = self.game_result()
-                print('')
-                print(description)
+        self.scheduler = FrameScheduler(frames_per_second)
+        self.scheduler.start()
 
-                return description
+    def drawers_for_tick(self, ended):
+        """Drawers that should draw the tick just simulated.
+
+           Interactive drawers can be skipped when the game loop is behind,
+           the other ones (like replays) always draw every tick.
+        """
+        skip_interactive = not self.scheduler.should_draw(
+            forced=ended or self.debug)
+        return [drawer for drawer in self.drawers
+                if not (skip_interactive and drawer.interactive)]
+
+    def finish_tick(self):
+        """Close the tick that was simulated and drawn, and save a checkpoint
+           when it's time to."""
+        self.world.finish_tick()
+        self.scheduler.tick_done()
+
+        if self.checkpoint_every and self.world.t % self.checkpoint_every == 0:
+            self.save_checkpoint(self.checkpoint_path)
+
+    def finish_game(self):
+        """Print the result of the ended game, and return its description."""
+        description = self.game_result()
+        print('')
+        print(description)
+        if not self.scheduler.unthrottled:
+            # headless games (like ladder matches) don't report pacing
+            print(self.scheduler.report())
+
+        return description
+
+    async def play_async(self, frames_per_second=2.0, act_timeout=None):
+        """Game main loop for asyncio, with async heroes and drawers (see
+           tota.asyncplay). Each async hero act can last up to act_timeout
+           seconds."""
+        from tota.asyncplay import play_async
+        return await play_async(self, frames_per_second, act_timeout)
+
+    def tick(self):
+        """Simulate one instant of the game."""
+        self.before_step()
+        self.world.step()
+        self.after_step()
+
+    def before_step(self):
+        # spawn creep wave
+        if self.world.t % self.settings.CREEP_WAVE_COOLDOWN == 0:
+            for team in (settings.TEAM_RADIANT, settings.TEAM_DIRE):
+                creeps = [Creep(team, settings=self.settings)
+                          for i in range(self.settings.CREEP_WAVE_SIZE)]
+                self.spawn_group_near_ancient(team, creeps)
+                self.world.notify('creep_wave', team, creeps)
+
+        self.spawn_heroes()
+
+    def after_step(self):
+        self.update_experience()
+        self.clean_deads()
+
+    def save_checkpoint(self, path):
+        """Save the state of the game, to be able to resume it later."""
+        from tota import checkpoint
+        checkpoint.save_checkpoint(self, path)
+
+    def resume(self, path):
+        """Continue the game from a checkpoint saved by the same setup."""
+        from tota import checkpoint
+        checkpoint.load_checkpoint(self, path)
 
     def spawn_heroes(self):
-        for hero in self.heroes:
-            if hero.respawn_at == self.world.t:
+        for team in (settings.TEAM_RADIANT, settings.TEAM_DIRE):
+            heroes = [hero for hero in self.heroes
+                      if hero.team == team and hero.respawn_at == self.world.t]
+            for hero in heroes:
                 hero.life = hero.max_life
-                self.spawn_near_ancient(hero)
+            if heroes:
+                self.spawn_group_near_ancient(team, heroes)
+
+    def dead_things(self):
+        """Things that died in this tick (only damaged things can die)."""
+        return [thing for thing in self.world.changes.damaged.values()
+                if not thing.alive and thing.position is not None]
 
     def update_experience(self):
-        for thing in list(self.world.things.values()):
-            if not thing.alive:
-                for hero in self.heroes:
-                    if hero.alive and hero.team != thing.team and distance(hero, thing) < settings.XP_DISTANCE:
-                        if isinstance(thing, Creep):
-                            hero.xp += settings.XP_CREEP_DEAD
-                        elif isinstance(thing, Hero):
-                            hero.xp += settings.XP_HERO_DEAD
-                        elif isinstance(thing, Tower):
-                            hero.xp += settings.XP_TOWER_DEAD
+        for thing in self.dead_things():
+            for hero in self.heroes:
+                if hero.alive and hero.team != thing.team and distance(hero, thing) < self.settings.XP_DISTANCE:
+                    if isinstance(thing, Creep):
+                        xp = self.settings.XP_CREEP_DEAD
+                    elif isinstance(thing, Hero):
+                        xp = self.settings.XP_HERO_DEAD
+                    elif isinstance(thing, Tower):
+                        xp = self.settings.XP_TOWER_DEAD
+                    else:
+                        continue
+
+                    hero.xp += xp
+                    self.world.notify('gained_xp', hero, xp, thing)
 
     def clean_deads(self):
         """Remove dead things from the world."""
-        for thing in list(self.world.things.values()):
-            if not thing.alive:
-                self.world.destroy(thing)
-                if isinstance(thing, Hero):
-                    thing.respawn_at = self.world.t + settings.HERO_RESPAWN_COOLDOWN
-
-    def draw(self):
-        """Call each drawer instance."""
-        for drawer in self.drawers:
+        for thing in self.dead_things():
+            self.world.destroy(thing)
+            if isinstance(thing, Hero):
+                thing.respawn_at = self.world.t + self.settings.HERO_RESPAWN_COOLDOWN
+
+    def draw(self, drawers=None):
+        """Call each drawer instance (or only the given ones)."""
+        if drawers is None:
+            drawers = self.drawers
+        for drawer in drawers:
             drawer.draw(self)
 
+    def close_drawers(self):
+        """Let each drawer instance finish its work."""
+        for drawer in self.drawers:
+            drawer.close(self)
+
     def destroyed_ancients(self):
         """Which ancients have been destroyed?"""
         return [ancient for ancient in self.ancients.values()
                 if not ancient.alive]
 
     def game_ended(self):
-        """Has the game ended?"""
-        return len(self.destroyed_ancients()) > 0
+        """Has the game ended? (or was it adjudicated?)"""
+        if self.destroyed_ancients():
+            return True
+        elif self.adjudicator is not None:
+            return self.adjudicator.check(self)
+        else:
+            return False
+
+    def adjudicated(self):
+        """Did the game end by adjudication, instead of a fallen ancient?"""
+        return (not self.destroyed_ancients() and
+                self.adjudicator is not None and self.adjudicator.decided)
+
+    def winner(self):
+        """Team that won the game (None if it didn't end, or in a draw)."""
+        if self.adjudicated():
+            return self.adjudicator.winner
+
+        losers = [ancient.team for ancient in self.destroyed_ancients()]
+        if len(losers) == 1:
+            return settings.ENEMY_TEAMS[losers[0]]
 
     def game_result(self):
         """Was the game won?"""
+        if self.adjudicated():
+            return self.adjudicator.description()
+
         return '\n'.join('Team {} lost!'.format(ancient.team)
                          for ancient in self.destroyed_ancients())
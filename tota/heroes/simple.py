@@ -19,13 +19,13 @@ def create():
             # else, try to attack
             if closest_enemy:
                 # there is an enemy
-                if closest_enemy_distance <= settings.STUN_DISTANCE and self.can('stun', t):
+                if closest_enemy_distance <= self.settings.STUN_DISTANCE and self.can('stun', t):
                     # try to stun him
                     return 'stun', closest_enemy.position
-                elif closest_enemy_distance <= settings.FIREBALL_DISTANCE and self.can('fireball', t) and closest_enemy_distance > settings.FIREBALL_RADIUS:
+                elif closest_enemy_distance <= self.settings.FIREBALL_DISTANCE and self.can('fireball', t) and closest_enemy_distance > self.settings.FIREBALL_RADIUS:
                     # else try to fireball him, but only if I'm not in range
                     return 'fireball', closest_enemy.position
-                elif closest_enemy_distance <= settings.HERO_ATTACK_DISTANCE:
+                elif closest_enemy_distance <= self.settings.HERO_ATTACK_DISTANCE:
                     # else try to attack him
                     return 'attack', closest_enemy.position
                 else:
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+"""Tota ladder runner.
+
+Usage:
+    ./ladder.py --help
+    ./ladder.py HEROES [-m MAP] [-s SIZE] [-n SEEDS] [-b DATABASE] [-a] [-g KIB] [-x MAX_TICKS] [-r MARGIN]
+    ./ladder.py HEROES --sprt [-m MAP] [-s SIZE] [-b DATABASE] [-g KIB] [-x MAX_TICKS] [-r MARGIN] [--max-games=GAMES] [--p1=P] [--error=E]
+
+    HEROES must be a comma separated list
+
+Options:
+    -h --help            Show this help.
+    -m MAP               The path to the map file to use (there is a default
+                         map)
+    -s SIZE              The size of the world. Format: COLUMNSxROWS
+    -n SEEDS             Number of seeded games to play for each pairing
+                         [default: 1].
+    -b DATABASE          The path to the results database
+                         [default: ./ladder.sqlite].
+    -a                   Play all the pairings, even the ones with results
+                         already stored.
+    -g KIB               Memory guard: fail the matches in which memory grows
+                         more than KIB kilobytes, without more things alive
+                         to explain it.
+    -x MAX_TICKS         Adjudicate the games that reach this tick, by the
+                         life of ancients and towers, and the heroes xp.
+    -r MARGIN            Adjudicate the games in which a team leads the score
+                         by this margin (0 to 1) for a while.
+    --sprt               Tournament mode: play games for each pair of heroes
+                         (switching sides) only until a sequential
+                         probability ratio test decides which one is better.
+    --max-games=GAMES    Max games of each pair in the tournament mode
+                         [default: 40].
+    --p1=P               Win probability of the better hero, for the test
+                         [default: 0.7].
+    --error=E            Max probability of the test picking the wrong hero
+                         [default: 0.05].
+"""
+import hashlib
+import math
+import random
+import sqlite3
+import time
+from collections import namedtuple
+from itertools import permutations, combinations
+
+from tota.game import Game
+from tota.world import EVENTS_HISTORY
+from tota.registry import registry
+from tota.adjudication import Adjudicator
+from tota.settings import Settings
+from tota import settings
+
+DEFAULT_MAP_SIZE = (87, 33)
+DEFAULT_MAP_PATH = './map.txt'
+
+ELO_INITIAL = 1500
+ELO_K = 32
+
+Match = namedtuple('Match', ['radiant', 'radiant_hash', 'dire', 'dire_hash',
+                             'map_hash', 'settings_hash', 'seed'])
+
+
+def hash_bytes(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def map_hash(map_file_path, world_size):
+    """Hash of a map file and the world size used to play it."""
+    with open(map_file_path, 'rb') as map_file:
+        data = map_file.read()
+
+    return hash_bytes(data + repr(tuple(world_size)).encode('utf-8'))
+
+
+def settings_hash(adjudication=None, game_settings=None):
+    """Hash of all the game settings values (and the adjudication rules)."""
+    values = (game_settings or Settings()).values()
+    if adjudication:
+        values.append(('adjudication', Adjudicator(**adjudication).key()))
+    return hash_bytes(repr(values).encode('utf-8'))
+
+
+class ResultsStore:
+    """Results of the played matches, stored in a sqlite database."""
+    def __init__(self, database_path):
+        self.connection = sqlite3.connect(database_path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                radiant TEXT NOT NULL,
+                radiant_hash TEXT NOT NULL,
+                dire TEXT NOT NULL,
+                dire_hash TEXT NOT NULL,
+                map_hash TEXT NOT NULL,
+                settings_hash TEXT NOT NULL,
+                seed INTEGER NOT NULL,
+                winner TEXT,
+                ticks INTEGER NOT NULL,
+                duration REAL NOT NULL,
+                played_at REAL NOT NULL,
+                PRIMARY KEY (radiant, radiant_hash, dire, dire_hash,
+                             map_hash, settings_hash, seed)
+            )
+        """)
+        self.connection.commit()
+
+    def has(self, match):
+        """Is there a stored result for this match?"""
+        return self.result(match) is not None
+
+    def result(self, match):
+        """The stored (winner, ) of a match, or None if it wasn't played."""
+        cursor = self.connection.execute("""
+            SELECT winner FROM results
+            WHERE radiant = ? AND radiant_hash = ? AND dire = ?
+              AND dire_hash = ? AND map_hash = ? AND settings_hash = ?
+              AND seed = ?
+        """, match)
+        return cursor.fetchone()
+
+    def save(self, match, winner, ticks, duration):
+        """Store (or replace) the result of a match."""
+        self.connection.execute("""
+            INSERT OR REPLACE INTO results
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, tuple(match) + (winner, ticks, duration, time.time()))
+        self.connection.commit()
+
+    def results(self, hero_hashes, map_hash, settings_hash):
+        """Results of the current versions of the heroes.
+
+           They are sorted by match (round by round of seeds), not by when
+           they were played, so the elo ratings computed from them only
+           depend on the results, and not on which matches were replayed.
+        """
+        cursor = self.connection.execute("""
+            SELECT radiant, radiant_hash, dire, dire_hash, winner FROM results
+            WHERE map_hash = ? AND settings_hash = ?
+            ORDER BY seed, radiant, dire, radiant_hash, dire_hash
+        """, (map_hash, settings_hash))
+
+        return [(radiant, dire, winner)
+                for radiant, radiant_hash, dire, dire_hash, winner in cursor
+                if hero_hashes.get(radiant) == radiant_hash and
+                hero_hashes.get(dire) == dire_hash]
+
+    def close(self):
+        self.connection.close()
+
+
+def schedule(store, heroes, map_file_path, world_size, seeds, play_all=False,
+             adjudication=None):
+    """Get the matches that need to be played, because their inputs changed.
+
+       Matches are identified by the hashes of the hero sources, the map and
+       the settings, so only matches involving something new are returned.
+    """
+    # the hashes of the code that is actually played (see HeroRegistry)
+    hero_hashes = {name: registry.digest(name) for name in heroes}
+    current_map_hash = map_hash(map_file_path, world_size)
+    current_settings_hash = settings_hash(adjudication)
+
+    matches = []
+    for radiant, dire in permutations(heroes, 2):
+        for seed in range(seeds):
+            match = Match(radiant, hero_hashes[radiant],
+                          dire, hero_hashes[dire],
+                          current_map_hash, current_settings_hash, seed)
+            if play_all or not store.has(match):
+                matches.append(match)
+
+    return matches
+
+
+def play_match(match, map_file_path, world_size, max_memory_growth=None,
+               adjudication=None):
+    """Play a match without drawing it, and return (winner, ticks).
+
+       With a max memory growth (in bytes), the match fails with an exception
+       if it seems to leak memory. The adjudication options are the ones of
+       Adjudicator.
+    """
+    if adjudication:
+        adjudicator = Adjudicator(**adjudication)
+    else:
+        adjudicator = None
+
+    random.seed(match.seed)
+    game = Game(radiant_heroes=[match.radiant],
+                dire_heroes=[match.dire],
+                map_file_path=map_file_path,
+                world_size=world_size,
+                adjudicator=adjudicator,
+                events_history=EVENTS_HISTORY)
+    if max_memory_growth is not None:
+        from tota.memory import MemoryMonitor
+        monitor = MemoryMonitor(game.world, max_growth=max_memory_growth)
+        try:
+            game.play()
+        finally:
+            monitor.stop()
+    else:
+        game.play()
+
+    return game.winner(), game.world.t
+
+
+def play_and_save(store, match, map_file_path, world_size,
+                  max_memory_growth=None, adjudication=None):
+    """Play a match and store its result. Returns the winner."""
+    started = time.time()
+    winner, ticks = play_match(match, map_file_path, world_size,
+                               max_memory_growth, adjudication)
+    store.save(match, winner, ticks, time.time() - started)
+    return winner
+
+
+class SequentialTest:
+    """Sequential probability ratio test, to know which of two heroes is
+       better with as few games as possible.
+
+       The hypotheses are that the first hero wins with probability p1, or
+       that the second one does. Draws count as half a win for each one.
+    """
+    def __init__(self, p1=0.7, error=0.05):
+        self.step = math.log(p1 / (1 - p1))
+        self.bound = math.log((1 - error) / error)
+        self.llr = 0.0
+        self.games = 0
+
+    def add(self, score):
+        """Add the score of a game for the first hero (1, 0.5 or 0)."""
+        self.llr += (2 * score - 1) * self.step
+        self.games += 1
+
+    def decision(self):
+        """1 if the first hero is better, -1 if the second one is, None if
+           more games are needed."""
+        if self.llr >= self.bound:
+            return 1
+        elif self.llr <= -self.bound:
+            return -1
+
+
+def tournament(store, heroes, map_file_path, world_size, max_games=40,
+               p1=0.7, error=0.05, max_memory_growth=None, adjudication=None):
+    """Play each pair of heroes, switching sides and seeds, until a
+       sequential test decides which one is better (or max games are played).
+
+       Stored results are used before playing new games. Yields
+       (hero, other hero, decision, games, played games) for each pair.
+    """
+    # the hashes of the code that is actually played (see HeroRegistry)
+    hero_hashes = {name: registry.digest(name) for name in heroes}
+    current_map_hash = map_hash(map_file_path, world_size)
+    current_settings_hash = settings_hash(adjudication)
+
+    for hero, other in combinations(heroes, 2):
+        test = SequentialTest(p1, error)
+        played = 0
+        for game_number in range(max_games):
+            if game_number % 2 == 0:
+                radiant, dire = hero, other
+            else:
+                radiant, dire = other, hero
+            match = Match(radiant, hero_hashes[radiant],
+                          dire, hero_hashes[dire],
+                          current_map_hash, current_settings_hash,
+                          game_number // 2)
+
+            result = store.result(match)
+            if result is None:
+                try:
+                    winner = play_and_save(store, match, map_file_path,
+                                           world_size, max_memory_growth,
+                                           adjudication)
+                except Exception as err:
+                    print('{} vs {} (seed {}) failed: {}'.format(
+                        match.radiant, match.dire, match.seed, err))
+                    continue
+                played += 1
+            else:
+                winner = result[0]
+
+            if winner is None:
+                test.add(0.5)
+            elif (winner == settings.TEAM_RADIANT) == (radiant == hero):
+                test.add(1)
+            else:
+                test.add(0)
+
+            if test.decision() is not None:
+                break
+
+        yield hero, other, test.decision(), test.games, played
+
+
+def standings(store, heroes, map_file_path, world_size, adjudication=None):
+    """Wins, losses, draws and elo rating of each hero, from stored results."""
+    # the hashes of the code that is actually played (see HeroRegistry)
+    hero_hashes = {name: registry.digest(name) for name in heroes}
+    results = store.results(hero_hashes,
+                            map_hash(map_file_path, world_size),
+                            settings_hash(adjudication))
+
+    table = {name: {'wins': 0, 'losses': 0, 'draws': 0, 'rating': ELO_INITIAL}
+             for name in heroes}
+
+    for radiant, dire, winner in results:
+        if winner == settings.TEAM_RADIANT:
+            radiant_score = 1.0
+            table[radiant]['wins'] += 1
+            table[dire]['losses'] += 1
+        elif winner == settings.TEAM_DIRE:
+            radiant_score = 0.0
+            table[radiant]['losses'] += 1
+            table[dire]['wins'] += 1
+        else:
+            radiant_score = 0.5
+            table[radiant]['draws'] += 1
+            table[dire]['draws'] += 1
+
+        radiant_rating = table[radiant]['rating']
+        dire_rating = table[dire]['rating']
+        expected = 1.0 / (1 + 10 ** ((dire_rating - radiant_rating) / 400.0))
+        change = ELO_K * (radiant_score - expected)
+        table[radiant]['rating'] += change
+        table[dire]['rating'] -= change
+
+    return sorted(table.items(),
+                  key=lambda item: item[1]['rating'],
+                  reverse=True)
+
+
+def ladder():
+    """Play the pending ladder matches, using the command line arguments."""
+    from docopt import docopt
+
+    arguments = docopt(__doc__)
+
+    heroes = arguments['HEROES'].split(',')
+
+    size = arguments['-s']
+    if size:
+        size = tuple(map(int, size.split('x')))
+    else:
+        size = DEFAULT_MAP_SIZE
+
+    map_path = arguments['-m'] or DEFAULT_MAP_PATH
+
+    max_memory_growth = arguments['-g']
+    if max_memory_growth:
+        max_memory_growth = int(max_memory_growth) * 1024
+
+    adjudication = {}
+    if arguments['-x']:
+        adjudication['max_ticks'] = int(arguments['-x'])
+    if arguments['-r']:
+        adjudication['resign_margin'] = float(arguments['-r'])
+
+    store = ResultsStore(arguments['-b'])
+
+    if arguments['--sprt']:
+        pairs = tournament(store, heroes, map_path, size,
+                           max_games=int(arguments['--max-games']),
+                           p1=float(arguments['--p1']),
+                           error=float(arguments['--error']),
+                           max_memory_growth=max_memory_growth,
+                           adjudication=adjudication)
+        for hero, other, decision, games, played in pairs:
+            if decision == 1:
+                verdict = '{} is better'.format(hero)
+            elif decision == -1:
+                verdict = '{} is better'.format(other)
+            else:
+                verdict = 'undecided'
+            print('{} vs {}: {} after {} games ({} new)'.format(
+                hero, other, verdict, games, played))
+    else:
+        matches = schedule(store, heroes, map_path, size, int(arguments['-n']),
+                           play_all=arguments['-a'],
+                           adjudication=adjudication)
+        print('{} matches to play'.format(len(matches)))
+
+        for match in matches:
+            try:
+                play_and_save(store, match, map_path, size,
+                              max_memory_growth, adjudication)
+            except Exception as err:
+                print('{} vs {} (seed {}) failed: {}'.format(
+                    match.radiant, match.dire, match.seed, err))
+
+    print('')
+    for position, (name, row) in enumerate(standings(store, heroes,
+                                                     map_path, size,
+                                                     adjudication), 1):
+        print('{}. {} {:.0f} ({} wins, {} losses, {} draws)'.format(
+            position, name, row['rating'],
+            row['wins'], row['losses'], row['draws']))
+
+    store.close()
+
+
+if __name__ == '__main__':
+    ladder()
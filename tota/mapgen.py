@@ -0,0 +1,148 @@
+"""Generator of maps of any size, for testing and load testing.
+
+The maps are mirrored (the dire half is the radiant half rotated 180
+degrees), with the ancients in opposite corners, up to 3 lanes between them
+(top, mid and bottom), trees everywhere else, and towers along the lanes.
+"""
+import random
+
+TREE = 'T'
+EMPTY = ' '
+
+LANES = {
+    1: ('mid', ),
+    2: ('top', 'bottom'),
+    3: ('top', 'mid', 'bottom'),
+}
+
+
+def line(start, end):
+    """The positions of a straight line between two positions."""
+    (x1, y1), (x2, y2) = start, end
+    steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+    return [(x1 + round((x2 - x1) * step / steps),
+             y1 + round((y2 - y1) * step / steps))
+            for step in range(steps + 1)]
+
+
+def path(points):
+    """The positions of a path made of straight lines between points."""
+    positions = []
+    for start, end in zip(points, points[1:]):
+        segment = line(start, end)
+        if positions:
+            segment = segment[1:]
+        positions.extend(segment)
+    return positions
+
+
+class MapGenerator:
+    """Builds the text of a valid map, with the given features."""
+    def __init__(self, width, height, lanes=1, lane_width=5,
+                 tree_density=0.9, towers_per_lane=1, base_radius=3,
+                 seed=None):
+        if lanes not in LANES:
+            raise Exception('Maps can have 1, 2 or 3 lanes, not {}'.format(lanes))
+        margin = base_radius + 1
+        if width < margin * 2 + 2 or height < margin * 2 + 2:
+            raise Exception("A {}x{} map is too small".format(width, height))
+
+        self.width = width
+        self.height = height
+        self.lanes = lanes
+        self.lane_width = lane_width
+        self.tree_density = tree_density
+        self.towers_per_lane = towers_per_lane
+        self.base_radius = base_radius
+        self.random = random.Random(seed)
+
+        self.margin = margin
+        self.radiant_ancient = (margin, height - 1 - margin)
+        self.dire_ancient = self.mirror(self.radiant_ancient)
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def mirror(self, position):
+        x, y = position
+        return self.width - 1 - x, self.height - 1 - y
+
+    def lane_path(self, lane):
+        """Positions of a lane, from the radiant to the dire ancient."""
+        start, end = self.radiant_ancient, self.dire_ancient
+        if lane == 'mid':
+            return path([start, end])
+        elif lane == 'top':
+            return path([start, (self.margin, self.margin), end])
+        elif lane == 'bottom':
+            corner = (self.width - 1 - self.margin,
+                      self.height - 1 - self.margin)
+            return path([start, corner, end])
+
+    def clear_around(self, cells, position, radius):
+        x_center, y_center = position
+        for x in range(x_center - radius, x_center + radius + 1):
+            for y in range(y_center - radius, y_center + radius + 1):
+                if 0 <= x < self.width and 0 <= y < self.height:
+                    cells[(x, y)] = EMPTY
+                    cells[self.mirror((x, y))] = EMPTY
+
+    def tower_positions(self, lane_path):
+        """Radiant towers of a lane, spread along its radiant half."""
+        half = lane_path[:len(lane_path) // 2]
+        start = self.base_radius + 2
+        positions = []
+        for tower in range(self.towers_per_lane):
+            index = start + (len(half) - start) * (tower + 1) // (self.towers_per_lane + 1)
+            if index < len(half):
+                positions.append(half[index])
+        return positions
+
+    def cells(self):
+        """The char of each position of the map."""
+        cells = {}
+        # trees are decided for the radiant half and mirrored to the other
+        for y in range(self.height):
+            for x in range(self.width):
+                position = (x, y)
+                if position not in cells:
+                    if self.random.random() < self.tree_density:
+                        char = TREE
+                    else:
+                        char = EMPTY
+                    cells[position] = char
+                    cells[self.mirror(position)] = char
+
+        towers = []
+        lane_radius = self.lane_width // 2
+        for lane in LANES[self.lanes]:
+            lane_path = self.lane_path(lane)
+            for position in lane_path:
+                self.clear_around(cells, position, lane_radius)
+            towers.extend(self.tower_positions(lane_path))
+
+        self.clear_around(cells, self.radiant_ancient, self.base_radius)
+
+        for position in towers:
+            cells[position] = 'r'
+            cells[self.mirror(position)] = 'd'
+        cells[self.radiant_ancient] = 'R'
+        cells[self.dire_ancient] = 'D'
+
+        return cells
+
+    def text(self):
+        """The map, in the same text format of map.txt."""
+        cells = self.cells()
+        return '\n'.join(''.join(cells[(x, y)] for x in range(self.width))
+                         for y in range(self.height))
+
+    def save(self, map_file_path):
+        with open(map_file_path, 'w', encoding='utf-8') as map_file:
+            map_file.write(self.text())
+
+
+def generate_map(width, height, **options):
+    """The text of a new map (see MapGenerator for the options)."""
+    return MapGenerator(width, height, **options).text()
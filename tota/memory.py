@@ -0,0 +1,176 @@
+import tracemalloc
+from array import array
+from collections import Counter
+
+# rough size of a thing alive in the world (object, attributes, dicts)
+BYTES_PER_THING = 1024
+
+
+class MemoryMonitor:
+    """Accounting of the memory used by a game, tick by tick.
+
+       Subscribe it to a world (it does it by itself), and it keeps per tick
+       counts of the live things of each class and of the size of the events
+       log. With snapshot_every, it also takes tracemalloc snapshots to find
+       what grows during the game.
+
+       With a max_growth (in bytes), it works as a guard: when the traced
+       memory grows more than that since the first snapshot, and the growth
+       isn't explained by the things alive in the world, an exception is
+       raised, failing the game.
+
+       Call stop when the game ends, so tracing doesn't slow down what comes
+       after it.
+    """
+    def __init__(self, world, snapshot_every=None, max_growth=None,
+                 bytes_per_thing=BYTES_PER_THING, top=10):
+        if max_growth is not None and snapshot_every is None:
+            snapshot_every = 100
+
+        self.world = world
+        self.snapshot_every = snapshot_every
+        self.max_growth = max_growth
+        self.top = top
+
+        self.live = Counter(type(thing).__name__
+                            for thing in world.things.values())
+        self.ticks = array('i')
+        self.counts = {}
+        self.events = array('i')
+
+        self.baseline = None
+        self.baseline_things = None
+        self.baseline_memory = 0
+        self.last_snapshot = None
+        self.last_memory = 0
+        self.peak = 0
+        self.bytes_per_thing = bytes_per_thing
+
+        # only the monitor that started tracing stops it
+        self.started_tracing = False
+        if snapshot_every and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+        world.subscribe(self)
+
+    def stop(self):
+        """Stop monitoring the world (the snapshots are kept for reports)."""
+        self.world.unsubscribe(self)
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def spawned(self, thing):
+        self.live[type(thing).__name__] += 1
+
+    def destroyed(self, thing):
+        self.live[type(thing).__name__] -= 1
+
+    def tick_changes(self, changes):
+        t = self.world.t
+        self.ticks.append(t)
+        for class_name in self.live:
+            if class_name not in self.counts:
+                # classes that appear late have 0 things in the older ticks
+                self.counts[class_name] = array('i', [0] * (len(self.ticks) - 1))
+        for class_name, counts in self.counts.items():
+            counts.append(self.live[class_name])
+        self.events.append(len(self.world.events))
+
+        if self.snapshot_every and t and t % self.snapshot_every == 0:
+            self.take_snapshot()
+
+    def things_count(self):
+        return sum(self.live.values())
+
+    def take_snapshot(self):
+        """Take a tracemalloc snapshot, and check the guard."""
+        # the memory used by the monitor itself isn't part of the game
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        current = sum(statistic.size
+                      for statistic in snapshot.statistics('filename'))
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+
+        if self.baseline is None:
+            # the first snapshot is taken after some ticks, so caches and
+            # the first creep waves are already there
+            self.baseline = snapshot
+            self.baseline_things = self.things_count()
+            self.baseline_memory = current
+        self.last_snapshot = snapshot
+        self.last_memory = current
+
+        if self.max_growth is not None:
+            unexplained = self.unexplained_growth()
+            if unexplained > self.max_growth:
+                message = ('Memory grew {:.0f} KiB at tick {}, not explained '
+                           'by live things (max {:.0f} KiB)\n{}')
+                raise Exception(message.format(unexplained / 1024,
+                                               self.world.t,
+                                               self.max_growth / 1024,
+                                               self.report()))
+
+    def growth(self):
+        """Bytes of traced memory gained since the first snapshot."""
+        if self.baseline is None:
+            return 0
+        return self.last_memory - self.baseline_memory
+
+    def unexplained_growth(self):
+        """Memory growth minus the memory of the extra things alive."""
+        if self.baseline is None:
+            return 0
+        extra_things = self.things_count() - self.baseline_things
+        return self.growth() - max(extra_things, 0) * self.bytes_per_thing
+
+    def growth_sources(self):
+        """The lines of code that allocated more memory since the baseline."""
+        if self.baseline is None or self.last_snapshot is self.baseline:
+            return []
+        differences = self.last_snapshot.compare_to(self.baseline, 'lineno')
+        return [difference for difference in differences[:self.top]
+                if difference.size_diff > 0]
+
+    def summary(self):
+        """Compact summary of the memory use, as plain data."""
+        return {
+            'ticks': len(self.ticks),
+            'live': {class_name: self.live[class_name]
+                     for class_name in self.counts},
+            'max_live': {class_name: max(counts) if counts else 0
+                         for class_name, counts in self.counts.items()},
+            'events': self.events[-1] if self.events else 0,
+            'max_events': max(self.events) if self.events else 0,
+            'growth': self.growth(),
+            'unexplained_growth': self.unexplained_growth(),
+            'peak': self.peak,
+            'sources': [(str(difference.traceback), difference.size_diff,
+                         difference.count_diff)
+                        for difference in self.growth_sources()],
+        }
+
+    def report(self):
+        """Summary of the memory use, as text."""
+        summary = self.summary()
+        lines = ['ticks: {}'.format(summary['ticks'])]
+        lines.append('live things: ' + ', '.join(
+            '{} {} (max {})'.format(count, class_name,
+                                    summary['max_live'][class_name])
+            for class_name, count in sorted(summary['live'].items())))
+        lines.append('events log: {} (max {})'.format(summary['events'],
+                                                      summary['max_events']))
+        if self.baseline is not None:
+            lines.append('memory growth: {:.1f} KiB ({:.1f} KiB not explained '
+                         'by live things), peak {:.1f} KiB'.format(
+                             summary['growth'] / 1024,
+                             summary['unexplained_growth'] / 1024,
+                             summary['peak'] / 1024))
+            for source, size_diff, count_diff in summary['sources']:
+                lines.append('  {:+.1f} KiB ({:+} blocks) {}'.format(
+                    size_diff / 1024, count_diff, source))
+
+        return '\n'.join(lines)
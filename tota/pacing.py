@@ -0,0 +1,98 @@
+import time
+
+
+class FrameScheduler:
+    """Paces the game loop, aiming at tick deadlines.
+
+       The time spent simulating and drawing each tick is discounted from the
+       wait, so the achieved rate is the requested one, as long as ticks are
+       cheaper than the frame interval. When the loop falls behind, drawing of
+       up to ``max_frame_skip`` frames in a row is skipped to catch up.
+       Without frames per second (None), it doesn't wait at all.
+    """
+    def __init__(self, frames_per_second=None, max_frame_skip=5):
+        if frames_per_second:
+            self.interval = 1.0 / frames_per_second
+        else:
+            self.interval = None
+        self.max_frame_skip = max_frame_skip
+
+        self.started_at = None
+        self.deadline = None
+        self.ticks = 0
+        self.frames = 0
+        self.skipped_in_a_row = 0
+
+    @property
+    def unthrottled(self):
+        return self.interval is None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        if not self.unthrottled:
+            self.deadline = self.started_at + self.interval
+
+    def should_draw(self, forced=False):
+        """Should this tick be drawn, or dropped to catch up? Forced frames
+           (like the last one, or in debug mode) are always drawn.
+
+           Frames are only counted when pacing (unthrottled games have no
+           interactive drawers).
+        """
+        if self.unthrottled:
+            return True
+
+        late = time.perf_counter() > self.deadline
+        if not forced and late and self.skipped_in_a_row < self.max_frame_skip:
+            self.skipped_in_a_row += 1
+            return False
+
+        self.skipped_in_a_row = 0
+        self.frames += 1
+        return True
+
+    def tick_done(self):
+        """Count a tick of the game loop (however the loop waits, if at all)."""
+        self.ticks += 1
+
+    def wait(self):
+        """Wait until the deadline of the current tick."""
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    def delay(self):
+        """Finish the current tick, and get the seconds to wait until its
+           deadline (for loops that wait in other ways, like asyncio)."""
+        if self.unthrottled:
+            return 0
+
+        now = time.perf_counter()
+        delay = 0
+        if now < self.deadline:
+            delay = self.deadline - now
+        elif now - self.deadline > self.interval * self.max_frame_skip:
+            # too far behind to catch up, start over from now
+            self.deadline = now
+
+        self.deadline += self.interval
+        return delay
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def tick_rate(self):
+        """Achieved ticks per second."""
+        elapsed = self.elapsed()
+        if elapsed > 0:
+            return self.ticks / elapsed
+        else:
+            return 0.0
+
+    def report(self):
+        text = '{} ticks in {:.2f} seconds ({:.1f} ticks/s'.format(
+            self.ticks, self.elapsed(), self.tick_rate())
+        if self.unthrottled:
+            return text + ')'
+        else:
+            return text + ', {} frames drawn)'.format(self.frames)
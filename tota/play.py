@@ -3,7 +3,7 @@
 
 Usage:
     ./play.py --help
-    ./play.py RADIANT_HEROES DIRE_HEROES [-m MAP] [-s SIZE] [-d] [-b] [-f MAX_FRAMES] [-c] [-r REPLAY_DIR] [-q]
+    ./play.py RADIANT_HEROES DIRE_HEROES [-m MAP] [-s SIZE] [-d] [-b] [-f MAX_FRAMES] [-c] [-r REPLAY_DIR] [-w PORT] [-v VIEWPORT] [-o HERO] [-k CHUNK_SIZE] [-i] [-t] [-q] [--memory=TICKS] [--checkpoint=FILE [--checkpoint-every=TICKS] [--resume]]
 
     DIRE_HEROES and RADIANT_HEROES must be comma separated lists
 
@@ -21,21 +21,44 @@ Options:
                          for your terminal.
     -r REPLAY_DIR        Save a json replay, which consists in *lots* of files
                          (1 per tick) inside the specified dir.
+    -w PORT              Broadcast the game to spectators connecting to the
+                         specified tcp port (1 json line per tick).
+    -v VIEWPORT          Only draw a window of the world in the terminal.
+                         Format: COLUMNSxROWS
+    -o HERO              Keep the terminal window centered on a hero.
+    -k CHUNK_SIZE        Simulate the world by chunks of the given size,
+                         skipping idle regions (useful for big maps).
+    -i                   Resolve the actions of each tick simultaneously,
+                         instead of one by one in random order.
+    -t                   Show the game statistics when the game ends.
     -q                   Don't draw the map in the terminal.
+    --memory=TICKS       Take memory snapshots every TICKS ticks, and show
+                         a memory report when the game ends.
+    --checkpoint=FILE    Periodically save the state of the game in a file.
+    --checkpoint-every=TICKS
+                         Ticks between checkpoints [default: 100].
+    --resume             Continue the game from the checkpoint file, if it
+                         exists.
 """
-from docopt import docopt
+import os
 
 from tota.game import Game
-from tota.drawers.terminal import TerminalDrawer
-from tota.drawers.json_replay import JsonReplayDrawer
+from tota.world import EVENTS_HISTORY
+from tota.resolution import SEQUENTIAL, SIMULTANEOUS
 
 DEFAULT_MAP_SIZE = (87, 33)
 DEFAULT_MAP_PATH = './map.txt'
 
-import os
+# clear the terminal and go to the top, without spawning a shell to do it
+CLEAR_SCREEN = '\033[2J\033[H'
+
 
 def play():
     """Initiate a game, using the command line arguments as configuration."""
+    # the cli dependencies, the drawers and the tools are only imported when
+    # used, so headless games start fast
+    from docopt import docopt
+
     arguments = docopt(__doc__)
 
     # start a game
@@ -48,14 +71,29 @@ def play():
     radiant_heroes = arguments['RADIANT_HEROES'].split(',')
     dire_heroes = arguments['DIRE_HEROES'].split(',')
 
+    viewport = arguments['-v']
+    if viewport:
+        viewport = tuple(map(int, viewport.split('x')))
+
     drawers = []
     if not arguments['-q']:
+        from tota.drawers.terminal import TerminalDrawer
         drawers.append(TerminalDrawer(use_basic_icons=use_basic_icons,
-                                      use_compressed_view=use_compressed_view))
+                                      use_compressed_view=use_compressed_view,
+                                      viewport=viewport,
+                                      follow=arguments['-o']))
 
     if arguments['-r']:
+        from tota.drawers.json_replay import JsonReplayDrawer
+        from tota.drawers.background import BackgroundDrawer
         replay_dir = arguments['-r']
-        drawers.append(JsonReplayDrawer(replay_dir=replay_dir))
+        # write the replay files in a background thread
+        drawers.append(BackgroundDrawer(JsonReplayDrawer(replay_dir=replay_dir)))
+
+    if arguments['-w']:
+        from tota.drawers.broadcast import BroadcastDrawer
+        port = int(arguments['-w'])
+        drawers.append(BroadcastDrawer(port=port))
 
     size = arguments['-s']
     if size:
@@ -65,16 +103,52 @@ def play():
 
     map_path = arguments['-m'] or DEFAULT_MAP_PATH
 
+    checkpoint_path = arguments['--checkpoint']
+    if checkpoint_path:
+        checkpoint_every = int(arguments['--checkpoint-every'])
+    else:
+        checkpoint_every = None
+
+    chunk_size = arguments['-k']
+    if chunk_size:
+        chunk_size = int(chunk_size)
+
     # create and start game
     g = Game(radiant_heroes=radiant_heroes,
              dire_heroes=dire_heroes,
              map_file_path=map_path,
              world_size=size,
              debug=debug,
-             drawers=drawers)
-    os.system('clear')
+             drawers=drawers,
+             chunk_size=chunk_size,
+             resolution=SIMULTANEOUS if arguments['-i'] else SEQUENTIAL,
+             checkpoint_path=checkpoint_path,
+             checkpoint_every=checkpoint_every,
+             events_history=EVENTS_HISTORY)
+
+    if arguments['--resume'] and os.path.exists(checkpoint_path):
+        g.resume(checkpoint_path)
+
+    if arguments['-t']:
+        from tota.stats import StatsCollector
+        stats = StatsCollector(g.world)
+
+    if arguments['--memory']:
+        from tota.memory import MemoryMonitor
+        memory = MemoryMonitor(g.world,
+                               snapshot_every=int(arguments['--memory']))
+
+    if not arguments['-q']:
+        print(CLEAR_SCREEN, end='')
     g.play(max_frames)
 
+    if arguments['-t']:
+        print(stats.report())
+
+    if arguments['--memory']:
+        memory.stop()
+        print(memory.report())
+
 
 if __name__ == '__main__':
     play()
@@ -0,0 +1,116 @@
+import hashlib
+import importlib.util
+import os
+import sys
+import threading
+from collections import namedtuple
+
+HeroEntry = namedtuple('HeroEntry', ['module', 'create', 'path', 'mtime',
+                                     'digest'])
+
+
+class HeroRegistry:
+    """Cache of hero modules, able to reload the ones that changed.
+
+       Each hero module is imported and validated only once, and its
+       ``create`` function is kept, so setting up a game doesn't import
+       anything. Long running servers can call ``refresh`` between matches to
+       pick up new versions of the heroes, without restarting.
+    """
+    def __init__(self, package='tota.heroes'):
+        self.package = package
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        """Get the create function of a hero."""
+        entry = self.entries.get(name)
+        if entry is None:
+            with self.lock:
+                entry = self.entries.get(name)
+                if entry is None:
+                    entry = self.load(name)
+                    self.entries[name] = entry
+
+        return entry.create
+
+    def digest(self, name):
+        """Hash of the source of the loaded version of a hero."""
+        self.get(name)
+        return self.entries[name].digest
+
+    def load(self, name):
+        """Import and validate a hero module, returning its registry entry."""
+        module_name = self.package + '.' + name
+        spec = importlib.util.find_spec(module_name)
+        if spec is None or spec.origin is None:
+            raise Exception("Can't find the {} hero".format(name))
+
+        # the same bytes are hashed and executed, so the code can't be a
+        # different version than its digest, even if the file is replaced
+        with open(spec.origin, 'rb') as hero_file:
+            mtime = os.fstat(hero_file.fileno()).st_mtime
+            source = hero_file.read()
+        digest = hashlib.sha1(source).hexdigest()
+
+        module = importlib.util.module_from_spec(spec)
+        exec(compile(source, spec.origin, 'exec'), module.__dict__)
+
+        create_function = getattr(module, 'create', None)
+        if not callable(create_function):
+            message = "The {} hero doesn't have a create function"
+            raise Exception(message.format(name))
+
+        sys.modules[module_name] = module
+
+        return HeroEntry(module, create_function, spec.origin, mtime, digest)
+
+    def changed(self, name):
+        """Has the source file of a loaded hero changed?
+
+           Files that were only touched (same contents) get their new mtime
+           stored, so they aren't hashed again on every refresh.
+        """
+        entry = self.entries[name]
+        try:
+            mtime = os.stat(entry.path).st_mtime
+            if mtime == entry.mtime:
+                return False
+
+            with open(entry.path, 'rb') as hero_file:
+                digest = hashlib.sha1(hero_file.read()).hexdigest()
+        except OSError:
+            return False
+
+        if digest == entry.digest:
+            self.entries[name] = entry._replace(mtime=mtime)
+            return False
+        else:
+            return True
+
+    def refresh(self):
+        """Reload the heroes whose source changed, and return their names.
+
+           A new version of a hero only replaces the old one if it can be
+           imported and validated, otherwise the old one is kept, and an
+           exception is raised after trying to refresh all the heroes.
+        """
+        reloaded = []
+        errors = []
+        with self.lock:
+            for name in list(self.entries):
+                if self.changed(name):
+                    try:
+                        self.entries[name] = self.load(name)
+                        reloaded.append(name)
+                    except Exception as err:
+                        errors.append('{}: {}'.format(name, str(err)))
+
+        if errors:
+            message = "Can't reload heroes, keeping old versions. {}"
+            raise Exception(message.format(', '.join(errors)))
+
+        return reloaded
+
+
+registry = HeroRegistry()
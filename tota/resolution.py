@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+# actions are performed one by one, in random order, each one seeing the
+# results of the previous ones
+SEQUENTIAL = 'sequential'
+# actions are validated against the state at the start of the tick, and
+# their results are applied all together at the end
+SIMULTANEOUS = 'simultaneous'
+
+RESOLUTIONS = (SEQUENTIAL, SIMULTANEOUS)
+
+
+def sorted_by_target(effects):
+    """(target, [(thing, amount), ...]) of some effects, sorted by ids."""
+    return [(target, sorted(amounts, key=lambda amount: amount[0].id))
+            for _, (target, amounts) in sorted(effects.items())]
+
+
+class Intents:
+    """The results that the actions of a tick want, before applying them.
+
+       Everything is grouped by target, so the results can be applied in a
+       single pass, no matter the order in which the actions were performed.
+    """
+    def __init__(self):
+        # position: things that want to move there
+        self.moves = defaultdict(list)
+        # id: (target, [(thing, amount), ...])
+        self.damages = {}
+        self.heals = {}
+        self.stuns = {}
+
+    def add(self, effects, thing, target, amount):
+        entry = effects.get(target.id)
+        if entry is None:
+            entry = effects[target.id] = (target, [])
+        entry[1].append((thing, amount))
+
+    def move(self, thing, position):
+        self.moves[position].append(thing)
+
+    def damage(self, thing, target, damage):
+        self.add(self.damages, thing, target, damage)
+
+    def heal(self, thing, target, heal):
+        self.add(self.heals, thing, target, heal)
+
+    def stun(self, thing, target, duration):
+        self.add(self.stuns, thing, target, duration)
@@ -69,3 +69,30 @@ EFFECT_COLORS = {
     'heal': 'cyan',
     'stun': 'magenta',
 }
+
+
+class Settings:
+    """The rules of a game: the values of this module, with some overrides.
+
+       Each game has its own settings (reaching its world, things and
+       actions), so games with different rules can be played at the same time
+       in the same process. The values are read from the module when the
+       settings are created.
+    """
+    def __init__(self, **overrides):
+        defaults = globals()
+        for name, value in defaults.items():
+            if name.isupper():
+                setattr(self, name, value)
+
+        for name, value in overrides.items():
+            if not name.isupper() or name not in defaults:
+                raise Exception('Unknown setting: {}'.format(name))
+            if isinstance(value, list):
+                # ranges (like damages) come as lists from json
+                value = tuple(value)
+            setattr(self, name, value)
+
+    def values(self):
+        """Sorted (name, value) of all the settings."""
+        return sorted(vars(self).items())
@@ -0,0 +1,39 @@
+def copy_thing(thing):
+    """Shallow copy of a thing (a lot faster than copy.copy)."""
+    new_thing = object.__new__(thing.__class__)
+    new_thing.__dict__ = thing.__dict__.copy()
+    return new_thing
+
+
+class WorldSnapshot:
+    """Copy of the parts of a world that drawers read."""
+    def __init__(self, world, copies):
+        self.t = world.t
+        self.size = world.size
+        self.effects = dict(world.effects)
+        self.things = {position: copies[thing.id]
+                       for position, thing in world.things.items()}
+
+        # only the events of the last tick
+        events = []
+        for event in reversed(world.events):
+            if event[0] != world.t:
+                break
+            events.append(event)
+        events.reverse()
+        self.events = events
+
+
+class GameSnapshot:
+    """Immutable copy of the state of a game in a tick.
+
+       Things are shallow copies, so it's cheap to build, and drawers can use
+       it just like a game (it has the same attributes they read).
+    """
+    def __init__(self, game):
+        self.debug = game.debug
+        copies = {thing.id: copy_thing(thing)
+                  for thing in game.world.things.values()}
+        self.heroes = [copies.get(hero.id) or copy_thing(hero)
+                       for hero in game.heroes]
+        self.world = WorldSnapshot(game.world, copies)
@@ -0,0 +1,99 @@
+from heapq import heappush, heappop
+
+from tota.utils import inside_map
+
+
+def ring_positions(center, radius, size):
+    """Positions of the map at exactly a distance from a center, in a fixed
+       order (closer to the diagonals first, then by position)."""
+    x_center, y_center = center
+    if radius == 0:
+        positions = [center]
+    else:
+        positions = []
+        for dx in range(-radius, radius + 1):
+            dy = radius - abs(dx)
+            positions.append((x_center + dx, y_center + dy))
+            if dy:
+                positions.append((x_center + dx, y_center - dy))
+
+    positions = [position for position in positions
+                 if inside_map(position, size)]
+    positions.sort(key=lambda position: (max(abs(position[0] - x_center),
+                                             abs(position[1] - y_center)),
+                                         position))
+    return positions
+
+
+class SpawnAllocator:
+    """Finds the closest empty positions to a center (like an ancient).
+
+       Candidate positions are ordered in rings around the center, computed
+       only as far as needed. The free ones are kept in a heap by their order,
+       and positions freed by things moving away or dying are added back
+       as the world publishes its changes. So finding a spawn position
+       doesn't depend on how crowded the area around the center is.
+    """
+    def __init__(self, world, center):
+        self.world = world
+        self.center = center
+        self.slots = []
+        self.ranks = {}
+        self.free = []
+        # ranks in the free heap, so each one is queued only once
+        self.queued = set()
+        self.radius = -1
+        self.max_radius = world.size[0] + world.size[1]
+
+        world.subscribe(self)
+
+    def add_ring(self):
+        """Compute the next ring of candidate positions."""
+        self.radius += 1
+        for position in ring_positions(self.center, self.radius,
+                                       self.world.size):
+            rank = len(self.slots)
+            self.slots.append(position)
+            self.ranks[position] = rank
+            if position not in self.world.things:
+                self.queue(rank)
+
+    def queue(self, rank):
+        if rank not in self.queued:
+            self.queued.add(rank)
+            heappush(self.free, rank)
+
+    def release(self, position):
+        rank = self.ranks.get(position)
+        if rank is not None and position not in self.world.things:
+            self.queue(rank)
+
+    def tick_changes(self, changes):
+        for _, old_position, _ in changes.moved.values():
+            self.release(old_position)
+        for _, position in changes.destroyed.values():
+            self.release(position)
+
+    def allocate(self, count=1):
+        """The closest empty positions (less than count if the map is full).
+
+           The positions aren't occupied until something is spawned there,
+           so they must be used right away.
+        """
+        positions = []
+        while len(positions) < count:
+            if not self.free:
+                if self.radius >= self.max_radius:
+                    break
+                self.add_ring()
+                continue
+
+            # stale entries (positions occupied since they were added) are
+            # just discarded
+            rank = heappop(self.free)
+            self.queued.discard(rank)
+            position = self.slots[rank]
+            if position not in self.world.things and position not in positions:
+                positions.append(position)
+
+        return positions
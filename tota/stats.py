@@ -0,0 +1,152 @@
+from tota.things import Creep, Hero, Tower, Ancient
+from tota import settings
+
+HERO_COUNTERS = ('damage_dealt', 'damage_taken', 'healing_done', 'stuns',
+                 'kills', 'last_hits', 'deaths', 'xp')
+TEAM_COUNTERS = ('damage_dealt', 'damage_to_ancient', 'creeps_lost',
+                 'creep_waves_lost', 'towers_lost', 'heroes_lost')
+
+
+class StatsCollector:
+    """Running statistics of a game, collected as things happen.
+
+       Subscribe it to a world (``world.subscribe(collector)``), and it keeps
+       counters per hero and per team. Nothing is kept for dead things, so
+       the memory used doesn't grow with the length of the game.
+    """
+    def __init__(self, world):
+        self.world = world
+        self.heroes = {}
+        self.teams = {team: dict.fromkeys(TEAM_COUNTERS, 0)
+                      for team in (settings.TEAM_RADIANT, settings.TEAM_DIRE)}
+        self.tower_deaths = {team: [] for team in self.teams}
+        self.ancient_death = None
+
+        # hero whose hit took each target from alive to dead in this tick.
+        # The kill is only counted when the target is destroyed, because a
+        # heal applied later in the same tick can bring it back to life
+        self.killers = {}
+
+        # creeps alive of each wave, to know when a whole wave was lost
+        self.creep_waves = {}
+        self.waves_alive = {}
+        self.wave_count = 0
+
+        world.subscribe(self)
+
+    def hero(self, hero):
+        # heroes live all the game (they respawn), and names can be repeated
+        counters = self.heroes.get(hero.id)
+        if counters is None:
+            counters = dict.fromkeys(HERO_COUNTERS, 0)
+            counters['name'] = hero.name
+            counters['team'] = hero.team
+            self.heroes[hero.id] = counters
+        return counters
+
+    def damaged(self, thing, target, damage):
+        if thing.team in self.teams:
+            self.teams[thing.team]['damage_dealt'] += damage
+            if isinstance(target, Ancient):
+                self.teams[thing.team]['damage_to_ancient'] += damage
+
+        if isinstance(thing, Hero):
+            self.hero(thing)['damage_dealt'] += damage
+        if isinstance(target, Hero):
+            self.hero(target)['damage_taken'] += damage
+
+        # the hit that takes the target from alive to dead
+        if isinstance(thing, Hero) and target.life <= 0 < target.life + damage:
+            self.killers[target.id] = thing
+
+    def healed(self, thing, target, heal):
+        if target.alive:
+            self.killers.pop(target.id, None)
+        if isinstance(thing, Hero):
+            self.hero(thing)['healing_done'] += heal
+
+    def stunned(self, thing, target, duration):
+        if isinstance(thing, Hero):
+            self.hero(thing)['stuns'] += 1
+
+    def gained_xp(self, hero, xp, dead_thing):
+        self.hero(hero)['xp'] += xp
+
+    def creep_wave(self, team, creeps):
+        self.wave_count += 1
+        self.waves_alive[self.wave_count] = len(creeps)
+        for creep in creeps:
+            self.creep_waves[creep.id] = self.wave_count
+
+    def destroyed(self, thing):
+        killer = self.killers.pop(thing.id, None)
+        if killer is not None:
+            self.hero(killer)['last_hits'] += 1
+            if isinstance(thing, Hero):
+                self.hero(killer)['kills'] += 1
+
+        team = self.teams.get(thing.team)
+        if team is None:
+            return
+
+        if isinstance(thing, Creep):
+            team['creeps_lost'] += 1
+            wave = self.creep_waves.pop(thing.id, None)
+            if wave is not None:
+                self.waves_alive[wave] -= 1
+                if self.waves_alive[wave] == 0:
+                    del self.waves_alive[wave]
+                    team['creep_waves_lost'] += 1
+        elif isinstance(thing, Hero):
+            team['heroes_lost'] += 1
+            self.hero(thing)['deaths'] += 1
+        elif isinstance(thing, Tower):
+            team['towers_lost'] += 1
+            self.tower_deaths[thing.team].append(self.world.t)
+        elif isinstance(thing, Ancient):
+            self.ancient_death = self.world.t
+
+    def summary(self):
+        """Compact summary of the game, as plain data."""
+        return {
+            'ticks': self.world.t,
+            'ancient_death': self.ancient_death,
+            'teams': {team: dict(counters,
+                                 tower_deaths=list(self.tower_deaths[team]))
+                      for team, counters in self.teams.items()},
+            'heroes': [dict(counters) for counters in self.heroes.values()],
+        }
+
+    def report(self):
+        """Summary of the game, as text for tournament reports."""
+        lines = ['ticks: {}'.format(self.world.t)]
+        for team, counters in sorted(self.teams.items()):
+            towers = ', '.join(str(t) for t in self.tower_deaths[team]) or '-'
+            lines.append('{}: {:.0f} damage ({:.0f} to ancient), '
+                         '{} creeps lost ({} waves), {} heroes lost, '
+                         'towers lost at: {}'.format(
+                             team,
+                             counters['damage_dealt'],
+                             counters['damage_to_ancient'],
+                             counters['creeps_lost'],
+                             counters['creep_waves_lost'],
+                             counters['heroes_lost'],
+                             towers))
+        for counters in sorted(self.heroes.values(),
+                               key=lambda counters: (counters['team'],
+                                                     counters['name'])):
+            lines.append('{} ({}): {:.0f} damage dealt, {:.0f} taken, '
+                         '{:.0f} healed, {} stuns, {} kills, {} last hits, '
+                         '{} deaths, {} xp'.format(
+                             counters['name'],
+                             counters['team'],
+                             counters['damage_dealt'],
+                             counters['damage_taken'],
+                             counters['healing_done'],
+                             counters['stuns'],
+                             counters['kills'],
+                             counters['last_hits'],
+                             counters['deaths'],
+                             counters['xp']))
+
+        return '\n'.join(lines)
@@ -1,19 +1,26 @@
+from itertools import count
+
 from tota import actions
-from tota import settings
+from tota.settings import Settings
 from tota.utils import distance, closest, sort_by_distance, possible_moves
 
 
 class Thing:
     ICON = '?'
     ICON_BASIC = '?'
+    # unique ids (python ids get reused after things are collected)
+    ids = count()
 
     """Something in the world."""
-    def __init__(self, name, life, team, acts, position=None):
-        if team not in (settings.TEAM_DIRE,
-                        settings.TEAM_RADIANT,
-                        settings.TEAM_NEUTRAL):
+    def __init__(self, name, life, team, acts, position=None, settings=None):
+        # the rules of the game of the thing
+        self.settings = settings or Settings()
+        if team not in (self.settings.TEAM_DIRE,
+                        self.settings.TEAM_RADIANT,
+                        self.settings.TEAM_NEUTRAL):
             raise Exception('Invalid team name: {}'.format(team))
 
+        self.id = next(Thing.ids)
         self.name = name
         self.life = life
         self._max_life = life
@@ -44,6 +51,17 @@ class Thing:
 
     def get_action(self, things, t):
         result = self.act(things, t)
+        # awaitable results (of async heroes) are remembered once awaited
+        if not hasattr(result, '__await__'):
+            self.remember_action(result)
+        return result
+
+    def get_chunked_action(self, world):
+        """Like get_action, for worlds with a chunks index (things can
+           override it to use the index instead of looking at every thing)."""
+        return self.get_action(world.things, world.t)
+
+    def remember_action(self, result):
         if result is None:
             self.last_action = None
             self.last_target = None
@@ -52,11 +70,20 @@ class Thing:
             self.last_action = action
             self.last_target = target_position
 
-        return result
-
     def act(self, things, t):
         return None
 
+    @property
+    def batch(self):
+        """Function to ask the action of many things at once (or None)."""
+        return None
+
+    @property
+    def activation_distance(self):
+        """Things that only act with enemies closer than this can be skipped
+           (None for things that always act)."""
+        return None
+
     def can(self, action, t):
         cooldown = self.possible_actions_cooldowns[action]
         last_use = self.last_uses.get(action, -100)
@@ -71,24 +98,28 @@ class Tree(Thing):
     ICON_BASIC = 'Y'
 
     """The ones that don't move."""
-    def __init__(self, position=None):
+    def __init__(self, position=None, settings=None):
+        settings = settings or Settings()
         super().__init__(name='tree',
                          life=settings.TREE_LIFE,
                          team=settings.TEAM_NEUTRAL,
                          acts=False,
-                         position=position)
+                         position=position,
+                         settings=settings)
 
 
 class Creep(Thing):
     ICON = '\u26AB'
     ICON_BASIC = '.'
 
-    def __init__(self, team, position=None):
+    def __init__(self, team, position=None, settings=None):
+        settings = settings or Settings()
         super().__init__(name='creep',
                          life=settings.CREEP_LIFE,
                          team=team,
                          acts=True,
-                         position=position)
+                         position=position,
+                         settings=settings)
 
         self.possible_actions = {
             'attack': actions.creep_attack,
@@ -100,20 +131,45 @@ class Creep(Thing):
         }
 
     def act(self, things, t):
-        enemy_team = settings.ENEMY_TEAMS[self.team]
+        enemy_team = self.settings.ENEMY_TEAMS[self.team]
         enemies = [thing for thing in things.values()
                    if thing.team == enemy_team]
         closest_enemy = closest(self, enemies)
-        closest_enemy_distance = distance(self, closest_enemy)
 
-        if closest_enemy_distance <= settings.CREEP_ATTACK_DISTANCE:
+        enemy_ancient = None
+        if distance(self, closest_enemy) > self.settings.CREEP_AGGRO_DISTANCE:
+            enemy_ancient = [thing for thing in enemies
+                             if isinstance(thing, Ancient)][0]
+
+        return self.chase(things, closest_enemy, enemy_ancient)
+
+    def get_chunked_action(self, world):
+        # only the enemies close enough to matter are looked up in the index
+        enemies = world.enemies_within(self, max(
+            self.settings.CREEP_ATTACK_DISTANCE,
+            self.settings.CREEP_AGGRO_DISTANCE))
+        closest_enemy = closest(self, enemies)
+
+        enemy_ancient = None
+        if (closest_enemy is None or
+                distance(self, closest_enemy) > self.settings.CREEP_AGGRO_DISTANCE):
+            enemy_ancient = world.ancients.get(self.settings.ENEMY_TEAMS[self.team])
+
+        result = self.chase(world.things, closest_enemy, enemy_ancient)
+        self.remember_action(result)
+        return result
+
+    def chase(self, things, closest_enemy, enemy_ancient):
+        """Attack the closest enemy if it's in range, otherwise move to it, or
+           to the enemy ancient if it's too far away (enemy_ancient is only
+           given in that case)."""
+        if (closest_enemy is not None and
+                distance(self, closest_enemy) <= self.settings.CREEP_ATTACK_DISTANCE):
             # enemy in range, attack!
             return 'attack', closest_enemy.position
         else:
-            if closest_enemy_distance > settings.CREEP_AGGRO_DISTANCE:
+            if enemy_ancient is not None:
                 # enemy too far away, go to the ancient
-                enemy_ancient = [thing for thing in enemies
-                                 if isinstance(thing, Ancient)][0]
                 move_target = enemy_ancient
             else:
                 # enemy in aggro distance, go to it!
@@ -131,12 +187,14 @@ class Tower(Thing):
     ICON = '\u265C'
     ICON_BASIC = 'I'
 
-    def __init__(self, team, position=None):
+    def __init__(self, team, position=None, settings=None):
+        settings = settings or Settings()
         super().__init__(name='tower',
                          life=settings.TOWER_LIFE,
                          team=team,
                          acts=True,
-                         position=position)
+                         position=position,
+                         settings=settings)
 
         self.possible_actions = {
             'attack': actions.tower_attack,
@@ -145,12 +203,16 @@ class Tower(Thing):
             'attack': 0,
         }
 
+    @property
+    def activation_distance(self):
+        return self.settings.TOWER_ATTACK_DISTANCE
+
     def act(self, things, t):
-        enemy_team = settings.ENEMY_TEAMS[self.team]
+        enemy_team = self.settings.ENEMY_TEAMS[self.team]
         enemies = [thing for thing in things.values()
                    if thing.team == enemy_team]
         closest_enemy = closest(self, enemies)
-        if distance(self, closest_enemy) <= settings.TOWER_ATTACK_DISTANCE:
+        if distance(self, closest_enemy) <= self.settings.TOWER_ATTACK_DISTANCE:
             return 'attack', closest_enemy.position
         else:
             return None
@@ -160,12 +222,14 @@ class Hero(Thing):
     ICON = '\u2689'
     ICON_BASIC = 'o'
 
-    def __init__(self, name, team, act_function, position=None):
+    def __init__(self, name, team, act_function, position=None,
+                 settings=None):
         super().__init__(name=name,
                          life=0,
                          team=team,
                          acts=True,
-                         position=position)
+                         position=position,
+                         settings=settings)
 
         self.act_function = act_function
         self.xp = 0
@@ -179,34 +243,40 @@ class Hero(Thing):
         self.possible_actions_cooldowns = {
             'attack': 0,
             'move': 0,
-            'heal': settings.HEAL_COOLDOWN,
-            'fireball': settings.FIREBALL_COOLDOWN,
-            'stun': settings.STUN_COOLDOWN,
+            'heal': self.settings.HEAL_COOLDOWN,
+            'fireball': self.settings.FIREBALL_COOLDOWN,
+            'stun': self.settings.STUN_COOLDOWN,
         }
         self.respawn_at = 0
 
     @property
     def level(self):
-        return int(self.xp / settings.XP_TO_LEVEL)
+        return int(self.xp / self.settings.XP_TO_LEVEL)
 
     @property
     def max_life(self):
-        health = settings.HERO_LIFE
-        health_multiplier = 1 + (self.level * settings.HERO_HEALTH_LEVEL_MULTIPLIER)
+        health = self.settings.HERO_LIFE
+        health_multiplier = 1 + (self.level * self.settings.HERO_HEALTH_LEVEL_MULTIPLIER)
 
         return health * health_multiplier
 
     def act(self, things, t):
         return self.act_function(self, things, t)
 
+    @property
+    def batch(self):
+        return getattr(self.act_function, 'batch', None)
+
 
 class Ancient(Thing):
     ICON = '\u265B'
     ICON_BASIC = '@'
 
-    def __init__(self, team, position=None):
+    def __init__(self, team, position=None, settings=None):
+        settings = settings or Settings()
         super().__init__(name='ancient',
                          life=settings.ANCIENT_LIFE,
                          team=team,
                          acts=False,
-                         position=position)
+                         position=position,
+                         settings=settings)
@@ -1,3 +1,4 @@
+from collections import deque
 from random import shuffle, random, choice, randint
 
 
@@ -81,12 +82,11 @@ def inside_map(something, size):
 def closes_empty_position(something, world):
     """Get the closest empty position to another thing or position."""
     position = to_position(something)
-    fringe = [position]
-    seen = set()
+    fringe = deque([position])
+    seen = {position}
 
     while fringe:
-        position = fringe.pop(0)
-        seen.add(position)
+        position = fringe.popleft()
         if position not in world.things:
             return position
         else:
@@ -94,6 +94,7 @@ def closes_empty_position(something, world):
             shuffle(adjacents)
             for adjacent in adjacents:
                 if adjacent not in seen and inside_map(adjacent, world.size):
+                    seen.add(adjacent)
                     fringe.append(adjacent)
 
     return None
@@ -1,19 +1,67 @@
 import random
+from collections import defaultdict
 
 from tota.things import Tree, Tower, Ancient
-from tota.utils import inside_map
+from tota.utils import inside_map, distance
+from tota.changes import ChangeSet
+from tota.batching import run_batches
+from tota.resolution import (Intents, sorted_by_target, SEQUENTIAL,
+                             SIMULTANEOUS, RESOLUTIONS)
+from tota.settings import Settings
 from tota import settings
 
+# ticks of events kept in the world log by the game runners (play, ladder
+# and cluster), so long games don't keep dead things alive
+EVENTS_HISTORY = 10
+
 
 class World:
-    """World where to play the game."""
-    def __init__(self, size, debug=False):
+    """World where to play the game.
+
+       With a chunk size, the world keeps an index of the acting things, and
+       of the team things in each chunk of the map. Then trees are never
+       visited when asking for actions, things with an activation distance
+       (like towers) aren't even asked when there are no enemies that close
+       to them, and creeps only look at the enemies in the chunks around
+       them (see Thing.get_chunked_action). Heroes still get all the things.
+
+       With an events history, only the events of that many last ticks are
+       kept, so the log doesn't keep dead things alive during long games (by
+       default, all of them are kept).
+
+       With simultaneous resolution, actions don't see the results of the
+       other actions of the same tick: their results are collected as intents
+       and applied all together at the end of the step, so the order of the
+       actions doesn't matter.
+
+       The settings are the rules of the game being played (by default, the
+       values of the settings module).
+    """
+    def __init__(self, size, debug=False, chunk_size=None,
+                 events_history=None, resolution=SEQUENTIAL,
+                 settings=None):
+        if resolution not in RESOLUTIONS:
+            raise Exception('Unknown resolution: {}'.format(resolution))
+
         self.size = size
         self.debug = debug
+        self.settings = settings or Settings()
         self.things = {}
         self.effects = {}
         self.t = 0
         self.events = []
+        self.events_history = events_history
+        self.resolution = resolution
+        # results of the actions, waiting to be applied (simultaneous mode)
+        self.intents = None
+
+        self.chunk_size = chunk_size
+        self.actors = {}
+        self.chunks = defaultdict(set)
+        self.ancients = {}
+
+        self.listeners = []
+        self.changes = ChangeSet(self.t, self.effects)
 
     def spawn(self, thing, position):
         """Add a thing to the world."""
@@ -25,59 +73,315 @@ class World:
         if other is None:
             self.things[position] = thing
             thing.position = position
+            if self.chunk_size:
+                self.index(thing)
+            self.changes.spawn(thing)
+            self.notify('spawned', thing)
         else:
             message = "Can't place {} in a position occupied by {}."
             raise Exception(message.format(thing, other))
 
     def destroy(self, thing):
         """Remove something from the world."""
+        if self.chunk_size:
+            self.unindex(thing)
+        self.notify('destroyed', thing)
+        self.changes.destroy(thing, thing.position)
         del self.things[thing.position]
         thing.position = None
         self.event(thing, 'died')
 
+    def move(self, thing, position):
+        """Move something to an (empty) position."""
+        if self.intents is not None:
+            self.intents.move(thing, position)
+        else:
+            self.apply_move(thing, position)
+
+    def apply_move(self, thing, position):
+        if self.chunk_size:
+            self.unindex(thing)
+        # we store position in the things, because they need to know it,
+        # but also in our dict, for faster access
+        self.things[position] = thing
+        del self.things[thing.position]
+        self.changes.move(thing, thing.position, position)
+        thing.position = position
+        if self.chunk_size:
+            self.index(thing)
+
+    def damage(self, thing, target, damage):
+        """A thing damages another one."""
+        if self.intents is not None:
+            self.intents.damage(thing, target, damage)
+        else:
+            self.apply_damage(thing, target, damage)
+
+    def apply_damage(self, thing, target, damage):
+        target.life -= damage
+        self.changes.damaged[target.id] = target
+        self.notify('damaged', thing, target, damage)
+
+    def heal(self, thing, target, heal):
+        """A thing heals another one, avoiding health overflow."""
+        if self.intents is not None:
+            self.intents.heal(thing, target, heal)
+        else:
+            self.apply_heal(thing, target, heal)
+
+    def apply_heal(self, thing, target, heal):
+        life = min(target.max_life, target.life + heal)
+        healed = life - target.life
+        target.life = life
+        self.changes.healed[target.id] = target
+        self.notify('healed', thing, target, healed)
+
+    def stun(self, thing, target, duration):
+        """A thing disables another one for some time."""
+        if self.intents is not None:
+            self.intents.stun(thing, target, duration)
+        else:
+            self.apply_stun(thing, target, duration)
+
+    def apply_stun(self, thing, target, duration):
+        target.disabled_until = self.t + duration
+        self.changes.stunned[target.id] = target
+        self.notify('stunned', thing, target, duration)
+
+    def subscribe(self, listener):
+        """Add a listener of the things that happen in the world.
+
+           Listeners can have any of these methods, called as things happen:
+           spawned(thing), destroyed(thing), damaged(thing, target, damage),
+           healed(thing, target, heal), stunned(thing, target, duration),
+           creep_wave(team, creeps), gained_xp(hero, xp, dead_thing),
+           and tick_changes(changes), with the ChangeSet of each tick.
+        """
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop telling a listener about the things that happen."""
+        self.listeners.remove(listener)
+
+    def notify(self, happening, *args):
+        """Tell the listeners about something that happened."""
+        for listener in self.listeners:
+            method = getattr(listener, happening, None)
+            if method is not None:
+                method(*args)
+
+    def finish_tick(self):
+        """Publish the changes of the tick, and start recording new ones."""
+        self.notify('tick_changes', self.changes)
+
+        cleared_effects = list(self.effects)
+        self.effects = {}
+        self.changes = ChangeSet(self.t, self.effects, cleared_effects)
+
+        if self.events_history is not None:
+            self.forget_events(self.t - self.events_history)
+
+    def forget_events(self, until_t):
+        """Remove the events logged up to (and including) a tick."""
+        old = 0
+        for t, _, _ in self.events:
+            if t > until_t:
+                break
+            old += 1
+        if old:
+            del self.events[:old]
+
+    def chunk(self, position):
+        return (position[0] // self.chunk_size,
+                position[1] // self.chunk_size)
+
+    def index(self, thing):
+        """Add a thing to the chunks index."""
+        if thing.acts:
+            self.actors[thing.id] = thing
+        if thing.team != settings.TEAM_NEUTRAL:
+            self.chunks[self.chunk(thing.position)].add(thing)
+        if isinstance(thing, Ancient):
+            self.ancients[thing.team] = thing
+
+    def unindex(self, thing):
+        """Remove a thing from the chunks index."""
+        self.actors.pop(thing.id, None)
+        chunk = self.chunk(thing.position)
+        self.chunks[chunk].discard(thing)
+        if not self.chunks[chunk]:
+            del self.chunks[chunk]
+        if self.ancients.get(thing.team) is thing:
+            del self.ancients[thing.team]
+
+    def enemies_near(self, thing, max_distance):
+        """Are there enemies of a thing within a distance? (chunked mode)"""
+        for _ in self.enemies_around(thing, max_distance):
+            return True
+        return False
+
+    def enemies_within(self, thing, max_distance):
+        """The enemies of a thing within a distance (chunked mode)."""
+        # sorted, because chunks are sets, and the order matters for the
+        # random tie breaks of seeded games (by position, because ids change
+        # when a game is resumed from a checkpoint)
+        return sorted(self.enemies_around(thing, max_distance),
+                      key=lambda other: other.position)
+
+    def enemies_around(self, thing, max_distance):
+        enemy_team = settings.ENEMY_TEAMS[thing.team]
+        x, y = thing.position
+        min_chunk_x, min_chunk_y = self.chunk((x - max_distance,
+                                               y - max_distance))
+        max_chunk_x, max_chunk_y = self.chunk((x + max_distance,
+                                               y + max_distance))
+
+        for chunk_x in range(min_chunk_x, max_chunk_x + 1):
+            for chunk_y in range(min_chunk_y, max_chunk_y + 1):
+                for other in self.chunks.get((chunk_x, chunk_y), ()):
+                    if other.team == enemy_team and distance(thing, other) <= max_distance:
+                        yield other
+
     def event(self, thing, message):
         """Log an event."""
         self.events.append((self.t, thing, message))
 
     def step(self):
         """Forward one instant of time."""
-        self.t += 1
+        self.start_step()
         actions = self.get_actions()
-        random.shuffle(actions)
-        self.perform_actions(actions)
+        self.finish_step(actions)
+
+    def start_step(self):
+        self.t += 1
+        self.changes.t = self.t
+
+    def finish_step(self, actions):
+        """Perform the actions of the step."""
+        if self.resolution == SIMULTANEOUS:
+            self.intents = Intents()
+            try:
+                self.perform_actions(actions)
+            finally:
+                intents, self.intents = self.intents, None
+            self.apply_intents(intents)
+        else:
+            random.shuffle(actions)
+            self.perform_actions(actions)
+
+    def apply_intents(self, intents):
+        """Apply the results of all the actions of a tick, target by target.
+
+           Things wanting to move to the same position all fail. Damages are
+           applied before heals, so a target ends with the sum of both (capped
+           to its max life), whatever the order of the actions was.
+        """
+        # everything is applied sorted, so even the order of the things in
+        # the world (and of the changes) doesn't depend on the actions order
+        for position, things in sorted(intents.moves.items()):
+            if len(things) == 1:
+                self.apply_move(things[0], position)
+            else:
+                for thing in things:
+                    message = "couldn't move to {}, {} things wanted it"
+                    self.event(thing, message.format(position, len(things)))
+
+        for target, amounts in sorted_by_target(intents.damages):
+            for thing, damage in amounts:
+                self.apply_damage(thing, target, damage)
+
+        for target, amounts in sorted_by_target(intents.heals):
+            for thing, heal in amounts:
+                self.apply_heal(thing, target, heal)
+
+        for target, amounts in sorted_by_target(intents.stuns):
+            for thing, duration in amounts:
+                self.apply_stun(thing, target, duration)
+
+    def get_actions(self, batches=None, awaiting=None):
+        """For each thing, call its act method to get its desired action.
+
+           Things with a batch function (see tota.batching) aren't asked one
+           by one: they are added to the batches dict, to ask all of them at
+           once. Without a batches dict, the batches are run right away.
+
+           Async heroes (whose act returns an awaitable) are only supported
+           with an awaiting list, where (thing, awaitable) are added to be
+           awaited by the async game loop (see tota.asyncplay).
+        """
+        run_now = batches is None
+        if run_now:
+            batches = {}
 
-    def get_actions(self):
-        """For each thing, call its act method to get its desired action."""
         actions = []
-        actors = [thing for thing in self.things.values()
-                  if thing.acts]
+        if self.chunk_size:
+            actors = list(self.actors.values())
+        else:
+            actors = [thing for thing in self.things.values()
+                      if thing.acts]
         for thing in actors:
-            if thing.disabled_until > self.t:
+            self.changes.acted[thing.id] = thing
+            if self.chunk_size and not self.activated(thing):
+                thing.last_action = None
+                thing.last_target = None
+                self.event(thing, 'is idle')
+            elif thing.disabled_until > self.t:
                 message = 'disabled until {}'.format(thing.disabled_until)
                 self.event(thing, message)
+            elif thing.batch is not None:
+                batches.setdefault(thing.batch, []).append((self, thing,
+                                                            actions))
             else:
                 try:
-                    act_result = thing.get_action(self.things, self.t)
-                    if act_result is None:
-                        message = 'is idle'
+                    if self.chunk_size:
+                        act_result = thing.get_chunked_action(self)
+                    else:
+                        act_result = thing.get_action(self.things, self.t)
+                    if hasattr(act_result, '__await__'):
+                        if awaiting is None:
+                            close = getattr(act_result, 'close', None)
+                            if close is not None:
+                                close()
+                            raise Exception('async heroes need an async game')
+                        awaiting.append((thing, act_result))
                     else:
-                        action, target_position = act_result
-                        if action not in thing.possible_actions:
-                            message = 'returned unknown action {}'.format(action)
-                        else:
-                            actions.append((thing, action, target_position))
-                            message = 'wants to {} into {}'.format(action,
-                                                                   target_position)
-                        self.event(thing, message)
+                        self.add_action(actions, thing, act_result)
                 except Exception as err:
-                    message = 'error with act from {}: {}'.format(thing.name,
-                                                                  str(err))
-                    self.event(thing, message)
-                    if self.debug:
-                        raise
+                    self.act_error(thing, err)
+
+        if run_now:
+            run_batches(batches)
 
         return actions
 
+    def add_action(self, actions, thing, act_result):
+        """Add the result of the act of a thing to the actions of the step."""
+        if act_result is None:
+            message = 'is idle'
+        else:
+            action, target_position = act_result
+            if action not in thing.possible_actions:
+                message = 'returned unknown action {}'.format(action)
+            else:
+                actions.append((thing, action, target_position))
+                message = 'wants to {} into {}'.format(action,
+                                                       target_position)
+        self.event(thing, message)
+
+    def act_error(self, thing, err):
+        message = 'error with act from {}: {}'.format(thing.name, str(err))
+        self.event(thing, message)
+        if self.debug:
+            raise err
+
+    def activated(self, thing):
+        """Does the thing need to be asked for an action? (chunked mode)"""
+        activation_distance = thing.activation_distance
+        if activation_distance is None:
+            return True
+        else:
+            return self.enemies_near(thing, activation_distance)
+
     def perform_actions(self, actions):
         """Execute actions, and add their results as events."""
         for thing, action, target_position in actions:
@@ -100,13 +404,17 @@ class World:
                 position = (col_index, row_index)
 
                 if char == 'T':
-                    self.spawn(Tree(), position)
+                    self.spawn(Tree(settings=self.settings), position)
                 elif char == 'r':
-                    self.spawn(Tower(settings.TEAM_RADIANT), position)
+                    self.spawn(Tower(settings.TEAM_RADIANT,
+                                     settings=self.settings), position)
                 elif char == 'd':
-                    self.spawn(Tower(settings.TEAM_DIRE), position)
+                    self.spawn(Tower(settings.TEAM_DIRE,
+                                     settings=self.settings), position)
                 elif char == 'R':
-                    self.spawn(Ancient(settings.TEAM_RADIANT), position)
+                    self.spawn(Ancient(settings.TEAM_RADIANT,
+                                       settings=self.settings), position)
                 elif char == 'D':
-                    self.spawn(Ancient(settings.TEAM_DIRE), position)
+                    self.spawn(Ancient(settings.TEAM_DIRE,
+                                       settings=self.settings), position)
 